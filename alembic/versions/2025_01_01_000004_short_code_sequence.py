@@ -0,0 +1,36 @@
+"""short code sequence table
+
+Revision ID: short_code_sequence_0004
+Revises: subscriptions_0003
+Create Date: 2025-01-01 00:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'short_code_sequence_0004'
+down_revision = 'subscriptions_0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    if 'short_code_sequence' not in existing_tables:
+        sequence = op.create_table(
+            'short_code_sequence',
+            sa.Column('id', sa.Integer(), primary_key=True, nullable=False),
+            sa.Column('next_value', sa.BigInteger(), nullable=False, server_default='0'),
+        )
+        op.bulk_insert(sequence, [{'id': 1, 'next_value': 0}])
+
+
+def downgrade() -> None:
+    try:
+        op.drop_table('short_code_sequence')
+    except Exception:
+        pass
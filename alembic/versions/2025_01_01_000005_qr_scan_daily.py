@@ -0,0 +1,44 @@
+"""daily scan rollup table
+
+Revision ID: qr_scan_daily_0005
+Revises: short_code_sequence_0004
+Create Date: 2025-01-01 00:40:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'qr_scan_daily_0005'
+down_revision = 'short_code_sequence_0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    # Populate existing history afterwards with: python -m app.scan_rollup backfill
+    if 'qr_scan_daily' not in existing_tables:
+        op.create_table(
+            'qr_scan_daily',
+            sa.Column('id', sa.Integer(), primary_key=True, nullable=False),
+            sa.Column('qr_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('device', sa.String(length=50), nullable=False),
+            sa.Column('os', sa.String(length=50), nullable=False),
+            sa.Column('browser', sa.String(length=50), nullable=False),
+            sa.Column('country', sa.String(length=64), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+            sa.ForeignKeyConstraint(['qr_id'], ['dynamic_qr.id'], ondelete='CASCADE'),
+            sa.UniqueConstraint('qr_id', 'day', 'device', 'os', 'browser', 'country', name='uq_qr_scan_daily_key'),
+        )
+
+
+def downgrade() -> None:
+    try:
+        op.drop_table('qr_scan_daily')
+    except Exception:
+        pass
@@ -0,0 +1,30 @@
+"""composite index for paging the scan log
+
+Revision ID: qr_scans_keyset_0006
+Revises: qr_scan_daily_0005
+Create Date: 2025-01-01 00:50:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'qr_scans_keyset_0006'
+down_revision = 'qr_scan_daily_0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    idx_names = {idx['name'] for idx in inspector.get_indexes('qr_scans')}
+    if 'ix_qr_scans_qr_id_scanned_at_id' not in idx_names:
+        op.create_index('ix_qr_scans_qr_id_scanned_at_id', 'qr_scans', ['qr_id', 'scanned_at', 'id'])
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_qr_scans_qr_id_scanned_at_id', table_name='qr_scans')
+    except Exception:
+        pass
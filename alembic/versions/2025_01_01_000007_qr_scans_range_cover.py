@@ -0,0 +1,42 @@
+"""covering index for date-range scan analytics
+
+Revision ID: qr_scans_range_cover_0007
+Revises: qr_scans_keyset_0006
+Create Date: 2025-01-01 01:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'qr_scans_range_cover_0007'
+down_revision = 'qr_scans_keyset_0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # (qr_id, scanned_at) range scans are served by ix_qr_scans_qr_id_scanned_at_id from
+    # qr_scans_keyset_0006 on every dialect. PostgreSQL also gets a covering variant so the
+    # per-dimension GROUP BYs over a range can be index-only scans; SQLite has no INCLUDE.
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+    idx_names = {idx['name'] for idx in inspector.get_indexes('qr_scans')}
+    if 'ix_qr_scans_qr_id_scanned_at_cover' not in idx_names:
+        op.create_index(
+            'ix_qr_scans_qr_id_scanned_at_cover',
+            'qr_scans',
+            ['qr_id', 'scanned_at'],
+            postgresql_include=['device', 'os', 'browser', 'country'],
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    try:
+        op.drop_index('ix_qr_scans_qr_id_scanned_at_cover', table_name='qr_scans')
+    except Exception:
+        pass
@@ -0,0 +1,48 @@
+"""scan archive manifest table
+
+Revision ID: scan_archive_parts_0008
+Revises: qr_scans_range_cover_0007
+Create Date: 2025-01-01 01:10:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'scan_archive_parts_0008'
+down_revision = 'qr_scans_range_cover_0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    if 'scan_archive_parts' not in existing_tables:
+        op.create_table(
+            'scan_archive_parts',
+            sa.Column('id', sa.Integer(), primary_key=True, nullable=False),
+            sa.Column('month', sa.String(length=7), nullable=False),
+            sa.Column('path', sa.String(length=500), nullable=False),
+            sa.Column('first_scan_id', sa.BigInteger(), nullable=False),
+            sa.Column('last_scan_id', sa.BigInteger(), nullable=False),
+            sa.Column('row_count', sa.Integer(), nullable=False),
+            sa.Column('first_day', sa.Date(), nullable=False),
+            sa.Column('last_day', sa.Date(), nullable=False),
+            sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+            sa.UniqueConstraint('path', name='uq_scan_archive_parts_path'),
+        )
+        op.create_index('ix_scan_archive_parts_month', 'scan_archive_parts', ['month'])
+
+
+def downgrade() -> None:
+    try:
+        op.drop_index('ix_scan_archive_parts_month', table_name='scan_archive_parts')
+    except Exception:
+        pass
+    try:
+        op.drop_table('scan_archive_parts')
+    except Exception:
+        pass
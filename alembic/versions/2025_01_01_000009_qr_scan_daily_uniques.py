@@ -0,0 +1,39 @@
+"""daily unique-scanner sketches
+
+Revision ID: qr_scan_daily_uniques_0009
+Revises: scan_archive_parts_0008
+Create Date: 2025-01-01 01:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'qr_scan_daily_uniques_0009'
+down_revision = 'scan_archive_parts_0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    # Existing history can be sketched with: python -m app.scan_rollup backfill
+    if 'qr_scan_daily_uniques' not in existing_tables:
+        op.create_table(
+            'qr_scan_daily_uniques',
+            sa.Column('qr_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('sketch', sa.LargeBinary(), nullable=False),
+            sa.ForeignKeyConstraint(['qr_id'], ['dynamic_qr.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('qr_id', 'day'),
+        )
+
+
+def downgrade() -> None:
+    try:
+        op.drop_table('qr_scan_daily_uniques')
+    except Exception:
+        pass
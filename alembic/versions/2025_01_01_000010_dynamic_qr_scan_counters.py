@@ -0,0 +1,37 @@
+"""scan counters on dynamic_qr
+
+Revision ID: dynamic_qr_scan_counters_0010
+Revises: qr_scan_daily_uniques_0009
+Create Date: 2025-01-01 01:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'dynamic_qr_scan_counters_0010'
+down_revision = 'qr_scan_daily_uniques_0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing_columns = {c['name'] for c in inspector.get_columns('dynamic_qr')}
+
+    # Fill in existing history afterwards with: python -m app.scan_rollup counters
+    with op.batch_alter_table('dynamic_qr') as batch_op:
+        if 'scan_count' not in existing_columns:
+            batch_op.add_column(sa.Column('scan_count', sa.Integer(), nullable=False, server_default='0'))
+        if 'last_scanned_at' not in existing_columns:
+            batch_op.add_column(sa.Column('last_scanned_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    try:
+        with op.batch_alter_table('dynamic_qr') as batch_op:
+            batch_op.drop_column('last_scanned_at')
+            batch_op.drop_column('scan_count')
+    except Exception:
+        pass
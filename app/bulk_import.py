@@ -0,0 +1,235 @@
+"""
+Bulk dynamic QR creation from a streamed CSV or NDJSON upload.
+
+Rows are parsed as the body arrives, inserted in multi-row chunks with codes
+from the short-code allocator, and the created codes are streamed back after
+each chunk commits. Neither the upload nor the result set is held in memory.
+"""
+from typing import AsyncIterator, Optional
+import codecs
+import csv
+import io
+import json
+import os
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.db import AsyncSessionLocal
+from app.models import DynamicQR
+from app.qr_assets import qr_asset_renderer
+from app.short_code_filter import short_code_filter
+from app.short_codes import short_code_allocator
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CREATE_CHUNK_SIZE", "500"))
+BULK_MAX_ROWS = int(os.getenv("BULK_CREATE_MAX_ROWS", "50000"))
+MAX_RECORD_BYTES = 16384
+_TITLE_MAX = 200
+_INSERT_ATTEMPTS = 3
+
+
+class BulkRowError(ValueError):
+    pass
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator may keep reading the request body.
+
+    The stock response listens for http.disconnect on receive() while it
+    streams, which would steal the upload's http.request messages.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def _records(chunks: AsyncIterator[bytes], quoted: bool) -> AsyncIterator[tuple[int, str]]:
+    """Yield (line number, record) pairs; with ``quoted``, CSV records may span lines inside quotes."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    pending = ""
+    line_no = 0
+    start_line = 1
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_no += 1
+            pending += line + "\n"
+            # A record is complete once its quotes balance (escaped quotes come in pairs)
+            if quoted and pending.count('"') % 2:
+                if len(pending) > MAX_RECORD_BYTES:
+                    raise BulkRowError(f"line {start_line}: record too long")
+                continue
+            yield start_line, pending.rstrip("\r\n")
+            pending = ""
+            start_line = line_no + 1
+        if len(buffer) > MAX_RECORD_BYTES:
+            raise BulkRowError(f"line {line_no + 1}: record too long")
+    buffer += decoder.decode(b"", final=True)
+    if pending or buffer:
+        yield start_line, (pending + buffer).rstrip("\r\n")
+
+
+def _validated(destination_url: object, title: object) -> tuple[str, Optional[str]]:
+    destination_url = str(destination_url or "").strip()
+    title = str(title or "").strip() or None
+    if not destination_url:
+        raise BulkRowError("destination_url is required")
+    if title is not None and len(title) > _TITLE_MAX:
+        raise BulkRowError(f"title is longer than {_TITLE_MAX} characters")
+    return destination_url, title
+
+
+async def parse_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple[int, object]]:
+    """Yield (line number, (destination_url, title)) or (line number, BulkRowError) per data row."""
+    columns: Optional[dict[str, int]] = None
+    first = True
+    async for line_no, record in _records(chunks, quoted=fmt == "csv"):
+        if not record.strip():
+            continue
+        try:
+            if fmt == "csv":
+                fields = next(csv.reader([record]))
+                if first:
+                    first = False
+                    header = [f.strip().lower() for f in fields]
+                    if "destination_url" in header:
+                        columns = {name: i for i, name in enumerate(header)}
+                        continue
+                if columns is not None:
+                    url_at, title_at = columns["destination_url"], columns.get("title")
+                    row = (
+                        fields[url_at] if url_at < len(fields) else "",
+                        fields[title_at] if title_at is not None and title_at < len(fields) else None,
+                    )
+                else:
+                    row = (fields[0] if fields else "", fields[1] if len(fields) > 1 else None)
+            else:
+                try:
+                    item = json.loads(record)
+                except ValueError:
+                    raise BulkRowError("invalid JSON")
+                if not isinstance(item, dict):
+                    raise BulkRowError("expected a JSON object")
+                row = (item.get("destination_url"), item.get("title"))
+            yield line_no, _validated(*row)
+        except BulkRowError as exc:
+            yield line_no, exc
+
+
+async def _insert_chunk(session, user_id: int, rows: list[tuple[int, tuple[str, Optional[str]]]]) -> list[tuple[int, str]]:
+    for attempt in range(_INSERT_ATTEMPTS):
+        codes = await short_code_allocator.allocate_many(len(rows))
+        values = [
+            {"user_id": user_id, "short_code": code, "destination_url": url, "title": title}
+            for code, (_, (url, title)) in zip(codes, rows)
+        ]
+        try:
+            await session.execute(insert(DynamicQR).values(values))
+            await session.commit()
+        except IntegrityError:
+            # A clash with a legacy random code: retry the chunk with fresh codes
+            await session.rollback()
+            if attempt == _INSERT_ATTEMPTS - 1:
+                raise
+            short_code_allocator.collisions += 1
+            continue
+        for code in codes:
+            short_code_filter.add(code)
+            qr_asset_renderer.enqueue(code)
+        return [(line_no, code) for (line_no, _), code in zip(rows, codes)]
+    return []
+
+
+class _ResultWriter:
+    def __init__(self, fmt: str, base_url: str):
+        self.fmt = fmt
+        self.base_url = base_url
+
+    def header(self) -> str:
+        return "line,short_code,redirect_url,absolute_redirect_url,error\r\n" if self.fmt == "csv" else ""
+
+    def _csv(self, values: list) -> str:
+        out = io.StringIO()
+        csv.writer(out).writerow(values)
+        return out.getvalue()
+
+    def created(self, line_no: int, short_code: str) -> str:
+        redirect_url = f"/r/{short_code}"
+        if self.fmt == "csv":
+            return self._csv([line_no, short_code, redirect_url, self.base_url + redirect_url, ""])
+        return json.dumps({
+            "line": line_no,
+            "short_code": short_code,
+            "redirect_url": redirect_url,
+            "absolute_redirect_url": self.base_url + redirect_url,
+        }) + "\n"
+
+    def error(self, line_no: Optional[int], message: str) -> str:
+        if self.fmt == "csv":
+            return self._csv([line_no if line_no is not None else "", "", "", "", message])
+        return json.dumps({"line": line_no, "error": message}) + "\n"
+
+    def summary(self, created: int, errors: int) -> str:
+        # CSV output carries no summary row; clients count rows
+        if self.fmt == "csv":
+            return ""
+        return json.dumps({"created": created, "errors": errors}) + "\n"
+
+
+async def bulk_create(
+    chunks: AsyncIterator[bytes],
+    user_id: int,
+    input_format: str,
+    output_format: str,
+    base_url: str,
+) -> AsyncIterator[str]:
+    """Parse, insert and report; each yielded string is one or more result lines."""
+    writer = _ResultWriter(output_format, base_url)
+    created = errors = rows_seen = 0
+    batch: list[tuple[int, tuple[str, Optional[str]]]] = []
+    header = writer.header()
+    if header:
+        yield header
+    aborted: Optional[str] = None
+    async with AsyncSessionLocal() as session:
+        try:
+            try:
+                async for line_no, row in parse_rows(chunks, input_format):
+                    if isinstance(row, BulkRowError):
+                        errors += 1
+                        yield writer.error(line_no, str(row))
+                        continue
+                    rows_seen += 1
+                    if rows_seen > BULK_MAX_ROWS:
+                        errors += 1
+                        yield writer.error(line_no, f"row limit of {BULK_MAX_ROWS} reached; remaining rows ignored")
+                        break
+                    batch.append((line_no, row))
+                    if len(batch) >= BULK_CHUNK_SIZE:
+                        inserted = await _insert_chunk(session, user_id, batch)
+                        batch = []
+                        created += len(inserted)
+                        yield "".join(writer.created(n, code) for n, code in inserted)
+            except BulkRowError as exc:
+                # The stream itself broke off; rows parsed before it are still inserted below
+                aborted = str(exc)
+            if batch:
+                inserted = await _insert_chunk(session, user_id, batch)
+                batch = []
+                created += len(inserted)
+                yield "".join(writer.created(n, code) for n, code in inserted)
+        except IntegrityError:
+            # Only _insert_chunk raises this, with the failed chunk still in batch: report each of its rows
+            errors += len(batch)
+            yield "".join(writer.error(n, "could not insert row; upload aborted") for n, _ in batch)
+        if aborted is not None:
+            errors += 1
+            yield writer.error(None, aborted)
+    yield writer.summary(created, errors)
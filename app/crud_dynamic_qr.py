@@ -1,25 +1,49 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import bindparam, case, or_, select, insert, func, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from typing import Optional, List
-from app.models import DynamicQR, QRScan
+from collections import Counter
+from datetime import date, datetime, timezone
+from app.models import DynamicQR, QRScan, QRScanDaily, QRScanDailyUniques
+from app.hll import HyperLogLog, merge_blobs
+from app.qr_assets import qr_asset_renderer
+from app.redirect_cache import short_code_cache
+from app.short_code_filter import short_code_filter
+from app.short_codes import short_code_allocator
+
+
+_CREATE_ATTEMPTS = 5
 
 
 async def create_dynamic_qr(
     session: AsyncSession,
     user_id: int,
-    short_code: str,
     destination_url: str,
     title: Optional[str] = None,
+    short_code: Optional[str] = None,
 ) -> DynamicQR:
-    qr = DynamicQR(
-        user_id=user_id,
-        short_code=short_code,
-        destination_url=destination_url,
-        title=title,
-    )
-    session.add(qr)
-    await session.commit()
+    """Insert a QR; without an explicit short_code one is taken from the allocator."""
+    for attempt in range(_CREATE_ATTEMPTS):
+        code = short_code or await short_code_allocator.allocate()
+        qr = DynamicQR(
+            user_id=user_id,
+            short_code=code,
+            destination_url=destination_url,
+            title=title,
+        )
+        session.add(qr)
+        try:
+            await session.commit()
+            break
+        except IntegrityError:
+            # Only a clash with a legacy random code is worth retrying
+            await session.rollback()
+            if short_code or attempt == _CREATE_ATTEMPTS - 1:
+                raise
+            short_code_allocator.collisions += 1
     await session.refresh(qr)
+    short_code_filter.add(qr.short_code)
+    qr_asset_renderer.enqueue(qr.short_code)
     return qr
 
 
@@ -33,6 +57,17 @@ async def list_user_qrs(session: AsyncSession, user_id: int) -> List[DynamicQR]:
     return list(result.scalars().all())
 
 
+async def list_user_short_codes(
+    session: AsyncSession, user_id: int, short_codes: Optional[List[str]] = None
+) -> List[str]:
+    """The user's short codes (optionally only those among ``short_codes``), without loading full rows."""
+    query = select(DynamicQR.short_code).where(DynamicQR.user_id == user_id)
+    if short_codes is not None:
+        query = query.where(DynamicQR.short_code.in_(short_codes))
+    result = await session.execute(query.order_by(DynamicQR.id))
+    return list(result.scalars().all())
+
+
 async def update_qr_destination(session: AsyncSession, qr_id: int, destination_url: str) -> Optional[DynamicQR]:
     result = await session.execute(select(DynamicQR).where(DynamicQR.id == qr_id))
     qr = result.scalar_one_or_none()
@@ -41,42 +76,312 @@ async def update_qr_destination(session: AsyncSession, qr_id: int, destination_u
     qr.destination_url = destination_url
     await session.commit()
     await session.refresh(qr)
+    short_code_cache.invalidate(qr.short_code)
     return qr
 
 
-async def record_scan(
+# Rows per multi-row INSERT; keeps bind parameters well under SQLite/PostgreSQL limits
+_SCAN_INSERT_CHUNK = 500
+
+
+async def record_scans_bulk(session: AsyncSession, rows: List[dict], commit: bool = True) -> int:
+    for start in range(0, len(rows), _SCAN_INSERT_CHUNK):
+        await session.execute(insert(QRScan).values(rows[start:start + _SCAN_INSERT_CHUNK]))
+    # Same transaction, so the rollup and counters never drift from the raw rows
+    await upsert_scan_rollups(session, rows, commit=False)
+    await add_scan_counters(session, rows)
+    if commit:
+        await session.commit()
+    return len(rows)
+
+
+_counter_update = (
+    update(DynamicQR.__table__)
+    .where(DynamicQR.__table__.c.id == bindparam("b_qr_id"))
+    .values(
+        scan_count=DynamicQR.__table__.c.scan_count + bindparam("b_count"),
+        last_scanned_at=case(
+            (
+                or_(
+                    DynamicQR.__table__.c.last_scanned_at.is_(None),
+                    DynamicQR.__table__.c.last_scanned_at < bindparam("b_last", type_=DynamicQR.last_scanned_at.type),
+                ),
+                bindparam("b_last", type_=DynamicQR.last_scanned_at.type),
+            ),
+            else_=DynamicQR.__table__.c.last_scanned_at,
+        ),
+    )
+)
+
+
+async def add_scan_counters(session: AsyncSession, rows: List[dict]) -> int:
+    """Bump scan_count/last_scanned_at for the QRs in a batch of scan rows, one UPDATE per QR (no commit)."""
+    totals: dict[int, list] = {}
+    for row in rows:
+        scanned_at = row.get("scanned_at") or datetime.now(timezone.utc)
+        entry = totals.get(row["qr_id"])
+        if entry is None:
+            totals[row["qr_id"]] = [1, scanned_at]
+        else:
+            entry[0] += 1
+            if scanned_at > entry[1]:
+                entry[1] = scanned_at
+    if totals:
+        # Increments are relative, so concurrent batches add up; id order keeps PostgreSQL row locks deadlock-free
+        await session.execute(_counter_update, [
+            {"b_qr_id": qr_id, "b_count": n, "b_last": last} for qr_id, (n, last) in sorted(totals.items())
+        ])
+    return len(totals)
+
+
+def _dimension(value: Optional[str], lower: bool = True) -> str:
+    if not value:
+        return "unknown"
+    return value.lower() if lower else value
+
+
+def _scan_day(scanned_at) -> date:
+    if isinstance(scanned_at, datetime):
+        if scanned_at.tzinfo is not None:
+            scanned_at = scanned_at.astimezone(timezone.utc)
+        return scanned_at.date()
+    if isinstance(scanned_at, date):
+        return scanned_at
+    if isinstance(scanned_at, str):
+        return date.fromisoformat(scanned_at[:10])
+    # Not set yet: the database default stamps the row now
+    return datetime.now(timezone.utc).date()
+
+
+def rollup_key(row: dict) -> tuple:
+    return (
+        row["qr_id"],
+        _scan_day(row.get("scanned_at")),
+        _dimension(row.get("device")),
+        _dimension(row.get("os")),
+        _dimension(row.get("browser")),
+        _dimension(row.get("country"), lower=False),
+    )
+
+
+def dialect_insert(session: AsyncSession, model):
+    """INSERT construct with on_conflict_* support for the session's database (PostgreSQL or SQLite)."""
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_
+    else:
+        from sqlalchemy.dialects.sqlite import insert as insert_
+    return insert_(model)
+
+
+def _upsert_statement(session: AsyncSession, values: List[dict]):
+    stmt = dialect_insert(session, QRScanDaily).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=["qr_id", "day", "device", "os", "browser", "country"],
+        set_={"count": QRScanDaily.count + stmt.excluded.count},
+    )
+
+
+async def upsert_scan_rollups(session: AsyncSession, rows: List[dict], commit: bool = True) -> int:
+    """Add scan rows (as written to qr_scans) to the daily rollup; returns the number of rollup keys touched."""
+    return await add_rollup_counts(session, Counter(rollup_key(row) for row in rows), commit=commit)
+
+
+async def add_rollup_counts(session: AsyncSession, counts: Counter, commit: bool = True) -> int:
+    values = [
+        {"qr_id": qr_id, "day": day, "device": device, "os": os, "browser": browser, "country": country, "count": n}
+        for (qr_id, day, device, os, browser, country), n in counts.items()
+    ]
+    for start in range(0, len(values), _SCAN_INSERT_CHUNK):
+        await session.execute(_upsert_statement(session, values[start:start + _SCAN_INSERT_CHUNK]))
+    if commit:
+        await session.commit()
+    return len(values)
+
+
+async def get_rollup_scan_stats(
     session: AsyncSession,
     qr_id: int,
-    ip: Optional[str],
-    country: Optional[str],
-    region: Optional[str],
-    city: Optional[str],
-    user_agent: Optional[str],
-    device: Optional[str],
-    os: Optional[str],
-    browser: Optional[str],
-    referrer: Optional[str],
-) -> QRScan:
-    scan = QRScan(
-        qr_id=qr_id,
-        ip=ip,
-        country=country,
-        region=region,
-        city=city,
-        user_agent=user_agent,
-        device=device,
-        os=os,
-        browser=browser,
-        referrer=referrer,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+) -> dict:
+    """Chart data for one QR from qr_scan_daily: cost grows with days x dimensions, not scans."""
+    query = (
+        select(
+            QRScanDaily.day,
+            QRScanDaily.device,
+            QRScanDaily.os,
+            QRScanDaily.browser,
+            func.sum(QRScanDaily.count),
+        )
+        .where(QRScanDaily.qr_id == qr_id)
+        .group_by(QRScanDaily.day, QRScanDaily.device, QRScanDaily.os, QRScanDaily.browser)
     )
-    session.add(scan)
-    await session.commit()
-    await session.refresh(scan)
-    return scan
+    if first_day is not None:
+        query = query.where(QRScanDaily.day >= first_day)
+    if last_day is not None:
+        query = query.where(QRScanDaily.day <= last_day)
+    result = await session.execute(query)
+    devices: Counter = Counter()
+    browsers: Counter = Counter()
+    oses: Counter = Counter()
+    dates: Counter = Counter()
+    for day, device, os, browser, count in result:
+        devices[device] += count
+        browsers[browser] += count
+        oses[os] += count
+        dates[day.isoformat() if isinstance(day, date) else str(day)] += count
+    return {"total": sum(dates.values()), "devices": devices, "browsers": browsers, "oses": oses, "dates": dates}
 
 
-async def list_qr_scans(session: AsyncSession, qr_id: int) -> List[QRScan]:
-    result = await session.execute(select(QRScan).where(QRScan.qr_id == qr_id))
-    return list(result.scalars().all())
+async def merge_scan_uniques(session: AsyncSession, scans: List[tuple], commit: bool = True) -> int:
+    """Fold (qr_id, scanned_at, fingerprint) triples into the per-day unique-scanner sketches."""
+    sketches: dict[tuple[int, date], HyperLogLog] = {}
+    for qr_id, scanned_at, fingerprint in scans:
+        key = (qr_id, _scan_day(scanned_at))
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = HyperLogLog()
+        sketch.add(fingerprint)
+    if sketches:
+        await add_unique_sketches(session, sketches)
+    if commit:
+        await session.commit()
+    return len(sketches)
+
+
+async def add_unique_sketches(session: AsyncSession, sketches: dict[tuple[int, date], HyperLogLog]) -> None:
+    """Merge sketches into qr_scan_daily_uniques, creating rows as needed (no commit)."""
+    keys = list(sketches)
+    empty = HyperLogLog().to_bytes()
+    for start in range(0, len(keys), _SCAN_INSERT_CHUNK):
+        chunk = keys[start:start + _SCAN_INSERT_CHUNK]
+        await session.execute(
+            dialect_insert(session, QRScanDailyUniques)
+            .values([{"qr_id": qr_id, "day": day, "sketch": empty} for qr_id, day in chunk])
+            .on_conflict_do_nothing(index_elements=["qr_id", "day"])
+        )
+        # Row locks (PostgreSQL) make concurrent flushes merge in turn instead of overwriting each other;
+        # on SQLite the transaction already holds the write lock
+        result = await session.execute(
+            select(QRScanDailyUniques.qr_id, QRScanDailyUniques.day, QRScanDailyUniques.sketch)
+            .where(tuple_(QRScanDailyUniques.qr_id, QRScanDailyUniques.day).in_(chunk))
+            .with_for_update()
+        )
+        params = [
+            {"qr_id": qr_id, "day": day, "sketch": HyperLogLog.from_bytes(blob).merge(sketches[(qr_id, day)]).to_bytes()}
+            for qr_id, day, blob in result
+        ]
+        if params:
+            await session.execute(update(QRScanDailyUniques), params)
+
+
+async def estimate_unique_scanners(
+    session: AsyncSession,
+    qr_id: int,
+    first_day: Optional[date] = None,
+    last_day: Optional[date] = None,
+) -> int:
+    """Approximate distinct scanners (IP + user agent) over a day range, merging one sketch per day."""
+    query = select(QRScanDailyUniques.sketch).where(QRScanDailyUniques.qr_id == qr_id)
+    if first_day is not None:
+        query = query.where(QRScanDailyUniques.day >= first_day)
+    if last_day is not None:
+        query = query.where(QRScanDailyUniques.day <= last_day)
+    result = await session.execute(query)
+    return merge_blobs(result.scalars()).estimate()
+
+
+_SCAN_DIMENSIONS = {
+    "device": QRScan.device,
+    "os": QRScan.os,
+    "browser": QRScan.browser,
+    "country": QRScan.country,
+}
+
+
+def scan_day_expression(session: AsyncSession):
+    """SQL expression for the UTC calendar day of QRScan.scanned_at."""
+    if session.get_bind().dialect.name == "postgresql":
+        return func.date(func.timezone("UTC", QRScan.scanned_at))
+    # SQLite stores UTC timestamps as text
+    return func.date(QRScan.scanned_at)
+
 
+def _scan_range(query, qr_id: int, since: Optional[datetime], until: Optional[datetime]):
+    query = query.where(QRScan.qr_id == qr_id)
+    if since is not None:
+        query = query.where(QRScan.scanned_at >= since)
+    if until is not None:
+        query = query.where(QRScan.scanned_at < until)
+    return query
 
+
+async def count_qr_scans(
+    session: AsyncSession, qr_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> int:
+    result = await session.execute(_scan_range(select(func.count(QRScan.id)), qr_id, since, until))
+    return result.scalar_one()
+
+
+async def count_qr_scans_by(
+    session: AsyncSession,
+    qr_id: int,
+    dimension: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Counter:
+    """Scan counts grouped by device/os/browser/country, normalised like the rollup (lowercase, "unknown")."""
+    column = _SCAN_DIMENSIONS[dimension]
+    value = column if dimension == "country" else func.lower(column)
+    bucket = func.coalesce(func.nullif(value, ""), "unknown").label(dimension)
+    result = await session.execute(_scan_range(select(bucket, func.count(QRScan.id)), qr_id, since, until).group_by(bucket))
+    return Counter({key: n for key, n in result})
+
+
+async def count_qr_scans_by_day(
+    session: AsyncSession, qr_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> Counter:
+    day = scan_day_expression(session).label("day")
+    result = await session.execute(_scan_range(select(day, func.count(QRScan.id)), qr_id, since, until).group_by(day))
+    return Counter({(d.isoformat() if isinstance(d, date) else str(d)): n for d, n in result})
+
+
+async def get_raw_scan_stats(
+    session: AsyncSession, qr_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None
+) -> dict:
+    """Same shape as get_rollup_scan_stats, aggregated from qr_scans with one GROUP BY per dimension."""
+    dates = await count_qr_scans_by_day(session, qr_id, since, until)
+    return {
+        "total": sum(dates.values()),
+        "devices": await count_qr_scans_by(session, qr_id, "device", since, until),
+        "browsers": await count_qr_scans_by(session, qr_id, "browser", since, until),
+        "oses": await count_qr_scans_by(session, qr_id, "os", since, until),
+        "dates": dates,
+    }
+
+
+async def list_qr_scans_page(
+    session: AsyncSession,
+    qr_id: int,
+    limit: int = 50,
+    before: Optional[tuple[datetime, int]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> tuple[List[QRScan], Optional[tuple[datetime, int]]]:
+    """
+    One page of a QR's scans, newest first, continuing after the ``before``
+    (scanned_at, id) key. Served by the (qr_id, scanned_at, id) index, so the
+    cost does not depend on how deep the page is. Returns the rows and the key
+    to pass for the next page (None on the last page).
+    """
+    query = _scan_range(select(QRScan), qr_id, since, until)
+    if before is not None:
+        query = query.where(tuple_(QRScan.scanned_at, QRScan.id) < tuple_(*before))
+    result = await session.execute(
+        query.order_by(QRScan.scanned_at.desc(), QRScan.id.desc()).limit(limit + 1)
+    )
+    scans = list(result.scalars().all())
+    if len(scans) <= limit:
+        return scans, None
+    scans = scans[:limit]
+    return scans, (scans[-1].scanned_at, scans[-1].id)
@@ -1,29 +1,50 @@
-from fastapi import APIRouter, Request, Depends, HTTPException, Body
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi import APIRouter, Request, Depends, HTTPException, Body, Query
+from fastapi.responses import RedirectResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from app.db import get_async_session
+from app.models import DynamicQR
 from app.crud_dynamic_qr import (
     create_dynamic_qr,
     get_qr_by_short_code,
     list_user_qrs,
     update_qr_destination,
-    record_scan,
-    list_qr_scans,
+    list_qr_scans_page,
+    get_raw_scan_stats,
+    get_rollup_scan_stats,
+    estimate_unique_scanners,
 )
-from typing import Optional
+from app.redirect_cache import short_code_cache
+from app.scan_ingest import ScanRecord, scan_ingestor
+from app.scan_dedup import scan_deduplicator, scan_fingerprint
+from app.scan_events import scan_event, scan_event_broker
+from app.ua_classifier import classify_user_agent, ua_classifier
+from app.geoip import get_geoip
+from app.short_code_filter import short_code_filter
+from app.short_codes import short_code_allocator
+from app.bulk_import import DuplexStreamingResponse, bulk_create
+from app.qr_assets import asset_url
+from app.scan_export import MEDIA_TYPES, export_scans
+from app.stats_cache import CachedStats, etag_matches, scan_stats_cache
+from typing import Mapping, Optional
 from collections import Counter
-from datetime import datetime
+from datetime import date, datetime, time, timedelta, timezone
+from urllib.parse import urlencode
+import base64
 import json
-from time import monotonic
-import secrets
 import os
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
+templates.env.globals["qr_asset_url"] = asset_url
 
 # Base URL for constructing absolute short links
 APP_BASE_URL = os.getenv("APP_BASE_URL", "https://qrgenerator.world").rstrip("/")
+# "rollup" reads qr_scan_daily; "raw" runs GROUP BY queries over qr_scans
+SCAN_STATS_SOURCE = os.getenv("SCAN_STATS_SOURCE", "rollup")
+SCANS_PAGE_SIZE = 50
+SCANS_PAGE_MAX = 200
 
 
 def get_user_id(request: Request) -> Optional[int]:
@@ -31,69 +52,54 @@ def get_user_id(request: Request) -> Optional[int]:
     return int(user_id) if user_id else None
 
 
-# Simple in-memory de-duplication for rapid repeat hits (e.g., browser double-fetch)
-_RECENT_SCANS: dict[str, float] = {}
-_RECENT_SCAN_TTL_SECONDS = 5.0
+def _should_record_scan(fingerprint: int) -> bool:
+    # De-duplicate rapid repeat hits (e.g., browser double-fetch)
+    return scan_deduplicator.should_record(fingerprint)
 
-def _should_record_scan(key: str) -> bool:
-    now = monotonic()
-    last = _RECENT_SCANS.get(key)
-    if last is not None and (now - last) < _RECENT_SCAN_TTL_SECONDS:
-        return False
-    _RECENT_SCANS[key] = now
-    # Opportunistic cleanup
-    if len(_RECENT_SCANS) > 10000:
-        expired = [k for k, t in _RECENT_SCANS.items() if (now - t) >= _RECENT_SCAN_TTL_SECONDS]
-        for k in expired:
-            _RECENT_SCANS.pop(k, None)
-    return True
 
+def _detect_device_os_browser(user_agent: str) -> tuple[str, Optional[str], Optional[str]]:
+    return classify_user_agent(user_agent)
+
+
+def _client_ip(headers: Mapping[str, str], fallback: str = "") -> str:
+    # Better public client IP detection (proxies/CDNs)
+    ip = headers.get("cf-connecting-ip") or headers.get("true-client-ip") or headers.get("x-real-ip") or headers.get("x-client-ip") or headers.get("fastly-client-ip")
+    if not ip:
+        xff = headers.get("x-forwarded-for")
+        if xff:
+            ip = xff.split(",")[0].strip()
+    if not ip:
+        fwd = headers.get("forwarded")
+        if fwd:
+            # e.g. Forwarded: for=203.0.113.43;proto=https;by=203.0.113.43
+            try:
+                parts = [p.strip() for p in fwd.split(";")]
+                for part in parts:
+                    if part.lower().startswith("for="):
+                        val = part.split("=", 1)[1].strip().strip('"')
+                        # strip possible port
+                        if val.startswith("[") and "]" in val:
+                            val = val[1:val.index("]")]
+                        if ":" in val:
+                            val = val.split(":")[0]
+                        ip = val
+                        break
+            except Exception:
+                pass
+    return ip or fallback
 
-def generate_short_code() -> str:
-    return secrets.token_urlsafe(6)[:8]
 
+_NOT_FOUND_HTML: Optional[bytes] = None
 
-def _detect_device_os_browser(user_agent: str) -> tuple[str, Optional[str], Optional[str]]:
-    ua = user_agent.lower()
-    # Device
-    device = "mobile" if any(x in ua for x in ["mobile", "iphone", "android", "ipod"]) else ("tablet" if any(x in ua for x in ["ipad", "tablet"]) else "desktop")
-    # OS
-    if "android" in ua:
-        os = "android"
-    elif any(x in ua for x in ["iphone", "ipad", "ipod", "ios"]):
-        os = "ios"
-    elif "windows" in ua:
-        os = "windows"
-    elif "mac os x" in ua or "macintosh" in ua:
-        os = "macos"
-    elif "cros" in ua:
-        os = "chromeos"
-    elif "linux" in ua:
-        os = "linux"
-    else:
-        os = None
-    # Browser (order matters)
-    if "yabrowser" in ua or "yandex" in ua:
-        browser = "yandex"
-    elif "opr/" in ua or "opera" in ua:
-        browser = "opera"
-    elif "edg/" in ua or "edge" in ua:
-        browser = "edge"
-    elif "samsungbrowser" in ua:
-        browser = "samsung"
-    elif "firefox" in ua or "fxios" in ua:
-        browser = "firefox"
-    elif "crios" in ua:
-        browser = "chrome"
-    elif "chrome" in ua and "chromium" not in ua and "edg" not in ua and "opr" not in ua and "yabrowser" not in ua:
-        browser = "chrome"
-    elif "safari" in ua:
-        browser = "safari"
-    elif "brave" in ua:
-        browser = "brave"
-    else:
-        browser = None
-    return device, os, browser
+
+def _not_found_response(request: Request) -> Response:
+    # Unknown short codes are mostly scanner/bot probes: serve 404.html rendered once, anonymously
+    global _NOT_FOUND_HTML
+    if _NOT_FOUND_HTML is None:
+        scope = dict(request.scope, path="/404", raw_path=b"/404", query_string=b"", session={})
+        anonymous = Request(scope)
+        _NOT_FOUND_HTML = templates.get_template("404.html").render({"request": anonymous}).encode("utf-8")
+    return Response(content=_NOT_FOUND_HTML, status_code=404, media_type="text/html")
 
 
 @router.get("/d/new", response_class=HTMLResponse)
@@ -121,54 +127,147 @@ async def create_dynamic_qr_endpoint(
             status_code=400,
         )
 
-    # Ensure unique short code
-    for _ in range(5):
-        short_code = generate_short_code()
-        existing = await get_qr_by_short_code(session, short_code)
-        if not existing:
-            break
-    else:
+    try:
+        qr = await create_dynamic_qr(session, user_id=user_id, destination_url=destination_url, title=title or None)
+    except IntegrityError:
         raise HTTPException(status_code=500, detail="Could not generate unique short link")
-
-    qr = await create_dynamic_qr(session, user_id=user_id, short_code=short_code, destination_url=destination_url, title=title or None)
     return RedirectResponse(f"/d/{qr.short_code}", status_code=302)
 
 
+def _pack_counts(counter: Counter) -> dict:
+    labels = list(counter.keys())
+    data = [counter[k] for k in labels]
+    return {"labels": labels, "data": data}
+
+
+def _pack_dates(date_counts: Mapping[str, int]) -> dict:
+    labels = sorted(date_counts.keys())
+    return {"labels": labels, "data": [date_counts[k] for k in labels]}
+
+
+def _encode_scan_cursor(key: Optional[tuple[datetime, int]]) -> Optional[str]:
+    if key is None:
+        return None
+    scanned_at, scan_id = key
+    raw = json.dumps([scanned_at.isoformat(), scan_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_scan_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        scanned_at, scan_id = json.loads(raw)
+        return datetime.fromisoformat(scanned_at), int(scan_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_scan_range(range_from: Optional[str], range_to: Optional[str]) -> tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Parse ?from=/?to= as ISO dates or datetimes (UTC when no offset is
+    given) into a [since, until) pair. A bare ``to`` date includes that whole day.
+    """
+    def parse(value: str, end: bool) -> datetime:
+        try:
+            if len(value) == 10:
+                parsed = datetime.combine(date.fromisoformat(value), time.min)
+                if end:
+                    parsed += timedelta(days=1)
+            else:
+                parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+        return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+    return (parse(range_from, False) if range_from else None, parse(range_to, True) if range_to else None)
+
+
+async def _scan_stats(session: AsyncSession, qr_id: int, range_from: Optional[str], range_to: Optional[str]) -> dict:
+    since, until = _parse_scan_range(range_from, range_to)
+    # The rollup has day granularity; ranges with a time of day go to qr_scans
+    day_aligned = all(value is None or len(value) == 10 for value in (range_from, range_to))
+    if SCAN_STATS_SOURCE != "raw" and day_aligned:
+        counts = await get_rollup_scan_stats(
+            session,
+            qr_id,
+            first_day=since.date() if since else None,
+            last_day=(until - timedelta(days=1)).date() if until else None,
+        )
+    else:
+        counts = await get_raw_scan_stats(session, qr_id, since, until)
+    uniques = await estimate_unique_scanners(
+        session,
+        qr_id,
+        first_day=since.astimezone(timezone.utc).date() if since else None,
+        last_day=(until - timedelta(microseconds=1)).astimezone(timezone.utc).date() if until else None,
+    )
+    return {
+        "total": counts["total"],
+        "uniques": uniques,
+        "devices": _pack_counts(counts["devices"]),
+        "browsers": _pack_counts(counts["browsers"]),
+        "oses": _pack_counts(counts["oses"]),
+        "dates": _pack_dates(counts["dates"]),
+    }
+
+
+async def _cached_scan_stats(
+    session: AsyncSession, qr: DynamicQR, range_from: Optional[str], range_to: Optional[str]
+) -> CachedStats:
+    # The counters move with every scan write, so an unchanged stamp means unchanged stats
+    key = (qr.id, range_from or "", range_to or "")
+    version = (qr.scan_count, qr.last_scanned_at)
+    entry = scan_stats_cache.get(key, version)
+    if entry is None:
+        stats = await _scan_stats(session, qr.id, range_from, range_to)
+        body = json.dumps(stats, separators=(",", ":")).encode("utf-8")
+        entry = scan_stats_cache.put(key, version, stats, body)
+    return entry
+
+
+def _export_response(body, fmt: str, compress: bool, filename: str) -> StreamingResponse:
+    extension = "csv" if fmt == "csv" else "ndjson"
+    if compress:
+        media_type, filename = "application/gzip", f"{filename}.{extension}.gz"
+    else:
+        media_type, filename = MEDIA_TYPES[fmt], f"{filename}.{extension}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _scan_json(scan) -> dict:
+    return {
+        "scanned_at": scan.scanned_at.isoformat() if isinstance(scan.scanned_at, datetime) else scan.scanned_at,
+        "device": scan.device,
+        "os": scan.os,
+        "browser": scan.browser,
+        "country": scan.country,
+    }
+
+
 @router.get("/d/{short_code}", response_class=HTMLResponse)
-async def view_dynamic_qr(request: Request, short_code: str, session: AsyncSession = Depends(get_async_session)):
+async def view_dynamic_qr(
+    request: Request,
+    short_code: str,
+    range_from: Optional[str] = Query(None, alias="from"),
+    range_to: Optional[str] = Query(None, alias="to"),
+    session: AsyncSession = Depends(get_async_session),
+):
     user_id = get_user_id(request)
     if not user_id:
         return RedirectResponse("/auth/login", status_code=307)
     qr = await get_qr_by_short_code(session, short_code)
     if not qr or qr.user_id != user_id:
         raise HTTPException(status_code=404, detail="QR not found")
-    scans = await list_qr_scans(session, qr.id)
-
-    # Build stats for charts
-    device_counts = Counter((s.device or "unknown").lower() for s in scans)
-    browser_counts = Counter((s.browser or "unknown").lower() for s in scans)
-    os_counts = Counter((s.os or "unknown").lower() for s in scans)
-    # Group by day
-    date_counts: dict[str, int] = {}
-    for s in scans:
-        try:
-            d = s.scanned_at.date().isoformat() if isinstance(s.scanned_at, datetime) else str(s.scanned_at).split(" ")[0]
-        except Exception:
-            d = "unknown"
-        date_counts[d] = date_counts.get(d, 0) + 1
-
-    def pack_counts(counter: Counter) -> dict:
-        labels = list(counter.keys())
-        data = [counter[k] for k in labels]
-        return {"labels": labels, "data": data}
-
-    stats = {
-        "total": len(scans),
-        "devices": pack_counts(device_counts),
-        "browsers": pack_counts(browser_counts),
-        "oses": pack_counts(os_counts),
-        "dates": {"labels": sorted(date_counts.keys()), "data": [date_counts[k] for k in sorted(date_counts.keys())]},
-    }
+    cached = await _cached_scan_stats(session, qr, range_from, range_to)
+    stats = cached.stats
+    since, until = _parse_scan_range(range_from, range_to)
+    scans, next_key = await list_qr_scans_page(session, qr.id, limit=SCANS_PAGE_SIZE, since=since, until=until)
+    today = datetime.now(timezone.utc).date()
+    range_params = {k: v for k, v in (("from", range_from), ("to", range_to)) if v}
 
     return templates.TemplateResponse(
         "dynamic_qr/show.html",
@@ -176,12 +275,38 @@ async def view_dynamic_qr(request: Request, short_code: str, session: AsyncSessi
             "request": request,
             "qr": qr,
             "scans": scans,
-            "stats_json": json.dumps(stats),
+            "total_scans": stats["total"],
+            "unique_scanners": stats["uniques"],
+            "next_cursor": _encode_scan_cursor(next_key),
+            "range_from": range_from or "",
+            "range_to": range_to or "",
+            "range_query": urlencode(range_params),
+            # Live updates only make sense while the range is open-ended
+            "live_updates": not range_to,
+            "range_presets": [(days, (today - timedelta(days=days - 1)).isoformat()) for days in (7, 30, 90)],
+            "stats_json": cached.body.decode("utf-8"),
             "short_url": f"{APP_BASE_URL}/r/{qr.short_code}",
         },
     )
 
 
+@router.get("/d/{short_code}/events")
+async def dynamic_qr_events(request: Request, short_code: str, session: AsyncSession = Depends(get_async_session)):
+    user_id = get_user_id(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    qr = await get_qr_by_short_code(session, short_code)
+    if not qr or qr.user_id != user_id:
+        raise HTTPException(status_code=404, detail="QR not found")
+    if not scan_event_broker.has_capacity():
+        raise HTTPException(status_code=503, detail="Too many live viewers; try again later")
+    return StreamingResponse(
+        scan_event_broker.stream(qr.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/d/{short_code}/update")
 async def update_dynamic_qr(request: Request, short_code: str, session: AsyncSession = Depends(get_async_session)):
     user_id = get_user_id(request)
@@ -209,9 +334,15 @@ async def my_dynamic_qrs(request: Request, session: AsyncSession = Depends(get_a
 
 @router.get("/r/{short_code}")
 async def redirect_short(request: Request, short_code: str, session: AsyncSession = Depends(get_async_session)):
-    qr = await get_qr_by_short_code(session, short_code)
-    if not qr:
-        raise HTTPException(status_code=404, detail="Link not found")
+    resolved = short_code_cache.get(short_code)
+    if resolved is None:
+        if not await short_code_filter.might_exist(session, short_code):
+            return _not_found_response(request)
+        qr = await get_qr_by_short_code(session, short_code)
+        if not qr:
+            short_code_filter.false_positives += 1
+            return _not_found_response(request)
+        resolved = short_code_cache.put(short_code, qr.id, qr.destination_url)
 
     # Parse user agent for device / OS / browser (including Yandex)
     ua = request.headers.get("user-agent", "")
@@ -223,37 +354,19 @@ async def redirect_short(request: Request, short_code: str, session: AsyncSessio
     region = request.headers.get("x-region") or None
 
     # De-duplicate rapid repeat requests from same client
-    # Better public client IP detection (proxies/CDNs)
-    ip = request.headers.get("cf-connecting-ip") or request.headers.get("true-client-ip") or request.headers.get("x-real-ip") or request.headers.get("x-client-ip") or request.headers.get("fastly-client-ip")
-    if not ip:
-        xff = request.headers.get("x-forwarded-for")
-        if xff:
-            ip = xff.split(",")[0].strip()
-    if not ip:
-        fwd = request.headers.get("forwarded")
-        if fwd:
-            # e.g. Forwarded: for=203.0.113.43;proto=https;by=203.0.113.43
-            try:
-                parts = [p.strip() for p in fwd.split(";")]
-                for part in parts:
-                    if part.lower().startswith("for="):
-                        val = part.split("=", 1)[1].strip().strip('"')
-                        # strip possible port
-                        if val.startswith("[") and "]" in val:
-                            val = val[1:val.index("]")]
-                        if ":" in val:
-                            val = val.split(":")[0]
-                        ip = val
-                        break
-            except Exception:
-                pass
-    if not ip:
-        ip = request.client.host if request.client else ""
-    fingerprint = f"{short_code}:{ip}:{ua[:64]}"
+    ip = _client_ip(request.headers, request.client.host if request.client else "")
+    # Fall back to the offline geo index when no proxy supplied a country
+    geoip = get_geoip()
+    if not country and ip and geoip is not None:
+        location = geoip.lookup(ip)
+        if location is not None:
+            country = location[0]
+            region = region or location[1]
+            city = city or location[2]
+    fingerprint = scan_fingerprint(short_code, ip, ua)
     if _should_record_scan(fingerprint):
-        await record_scan(
-            session,
-            qr_id=qr.id,
+        record = ScanRecord(
+            qr_id=resolved.qr_id,
             ip=ip,
             country=country,
             region=region,
@@ -263,9 +376,29 @@ async def redirect_short(request: Request, short_code: str, session: AsyncSessio
             os=os,
             browser=browser,
             referrer=request.headers.get("referer"),
+            fingerprint=fingerprint,
         )
+        if await scan_ingestor.submit(record) and scan_event_broker.has_subscribers(resolved.qr_id):
+            scan_event_broker.publish(resolved.qr_id, scan_event(record.as_row()))
+
+    return RedirectResponse(resolved.destination_url, status_code=302)
+
 
-    return RedirectResponse(qr.destination_url, status_code=302)
+@router.get("/admin/metrics/redirects")
+async def redirect_metrics(request: Request):
+    if not request.session.get("admin_id"):
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return {
+        "short_code_cache": short_code_cache.stats(),
+        "short_code_filter": short_code_filter.stats(),
+        "short_code_allocator": short_code_allocator.stats(),
+        "scan_ingest": scan_ingestor.stats(),
+        "scan_events": scan_event_broker.stats(),
+        "scan_stats_cache": scan_stats_cache.stats(),
+        "scan_dedup": scan_deduplicator.stats(),
+        "ua_classifier": ua_classifier.stats(),
+        "geoip": get_geoip().stats() if get_geoip() is not None else None,
+    }
 
 
 @router.post("/api/d/create")
@@ -283,18 +416,10 @@ async def api_create_dynamic_qr(
     if not destination_url:
         raise HTTPException(status_code=422, detail="destination_url is required")
 
-    # Ensure unique short code
-    for _ in range(5):
-        short_code = generate_short_code()
-        existing = await get_qr_by_short_code(session, short_code)
-        if not existing:
-            break
-    else:
+    try:
+        qr = await create_dynamic_qr(session, user_id=user_id, destination_url=destination_url, title=title)
+    except IntegrityError:
         raise HTTPException(status_code=500, detail="Could not generate unique short link")
-
-    qr = await create_dynamic_qr(
-        session, user_id=user_id, short_code=short_code, destination_url=destination_url, title=title
-    )
     return {
         "short_code": qr.short_code,
         "redirect_url": f"/r/{qr.short_code}",
@@ -302,3 +427,117 @@ async def api_create_dynamic_qr(
     }
 
 
+@router.post("/api/d/bulk")
+async def api_bulk_create_dynamic_qr(request: Request):
+    """
+    Create many dynamic QRs from a CSV (text/csv) or NDJSON (application/x-ndjson)
+    upload of destination_url,title rows. Results stream back as NDJSON, or CSV
+    when the client accepts text/csv.
+    """
+    user_id = get_user_id(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    content_type = request.headers.get("content-type", "").lower()
+    if "csv" in content_type:
+        input_format = "csv"
+    elif "json" in content_type:
+        input_format = "ndjson"
+    else:
+        raise HTTPException(status_code=415, detail="Upload text/csv or application/x-ndjson")
+    output_format = "csv" if "text/csv" in request.headers.get("accept", "").lower() else "ndjson"
+
+    return DuplexStreamingResponse(
+        bulk_create(request.stream(), user_id, input_format, output_format, APP_BASE_URL),
+        media_type="text/csv" if output_format == "csv" else "application/x-ndjson",
+    )
+
+
+@router.get("/api/d/{short_code}/stats")
+async def api_qr_stats(
+    request: Request,
+    short_code: str,
+    range_from: Optional[str] = Query(None, alias="from"),
+    range_to: Optional[str] = Query(None, alias="to"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    user_id = get_user_id(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    qr = await get_qr_by_short_code(session, short_code)
+    if not qr or qr.user_id != user_id:
+        raise HTTPException(status_code=404, detail="QR not found")
+    cached = await _cached_scan_stats(session, qr, range_from, range_to)
+    # Browsers must revalidate each time, but an unchanged payload costs them a bare 304
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+@router.get("/api/d/{short_code}/scans")
+async def api_list_qr_scans(
+    request: Request,
+    short_code: str,
+    cursor: Optional[str] = None,
+    limit: int = SCANS_PAGE_SIZE,
+    range_from: Optional[str] = Query(None, alias="from"),
+    range_to: Optional[str] = Query(None, alias="to"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    user_id = get_user_id(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    qr = await get_qr_by_short_code(session, short_code)
+    if not qr or qr.user_id != user_id:
+        raise HTTPException(status_code=404, detail="QR not found")
+    before = _decode_scan_cursor(cursor) if cursor else None
+    since, until = _parse_scan_range(range_from, range_to)
+    scans, next_key = await list_qr_scans_page(
+        session, qr.id, limit=max(1, min(limit, SCANS_PAGE_MAX)), before=before, since=since, until=until
+    )
+    return {"scans": [_scan_json(scan) for scan in scans], "next_cursor": _encode_scan_cursor(next_key)}
+
+
+@router.get("/api/d/{short_code}/scans/export")
+async def api_export_qr_scans(
+    request: Request,
+    short_code: str,
+    format: str = "csv",
+    gzip: bool = False,
+    range_from: Optional[str] = Query(None, alias="from"),
+    range_to: Optional[str] = Query(None, alias="to"),
+    session: AsyncSession = Depends(get_async_session),
+):
+    user_id = get_user_id(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    qr = await get_qr_by_short_code(session, short_code)
+    if not qr or qr.user_id != user_id:
+        raise HTTPException(status_code=404, detail="QR not found")
+    start, end = _parse_scan_range(range_from, range_to)
+    body = export_scans(user_id, format, qr_id=qr.id, since=start, until=end, compress=gzip)
+    return _export_response(body, format, gzip, f"scans-{qr.short_code}")
+
+
+@router.get("/api/scans/export")
+async def api_export_user_scans(
+    request: Request,
+    format: str = "csv",
+    gzip: bool = False,
+    range_from: Optional[str] = Query(None, alias="from"),
+    range_to: Optional[str] = Query(None, alias="to"),
+):
+    """Every scan across the signed-in user's QRs, grouped by QR."""
+    user_id = get_user_id(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    start, end = _parse_scan_range(range_from, range_to)
+    body = export_scans(user_id, format, since=start, until=end, compress=gzip)
+    return _export_response(body, format, gzip, "scans")
+
+
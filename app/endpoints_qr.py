@@ -0,0 +1,147 @@
+from fastapi import APIRouter, Request, Depends, HTTPException, Body
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import get_async_session
+from app.crud_dynamic_qr import get_qr_by_short_code, list_user_short_codes
+from app.endpoints_dynamic_qr import APP_BASE_URL, get_user_id
+from app.qr_assets import qr_asset_renderer
+from app.qr_batch import QR_BATCH_MAX_CODES, qr_batch_renderer
+from app.qr_render import MEDIA_TYPES, QRRenderError, parse_spec, qr_image_cache
+from app.redirect_cache import short_code_cache
+from app.stats_cache import etag_matches
+
+router = APIRouter()
+
+# Static images are fully determined by their URL; dynamic ones depend on APP_BASE_URL, so revalidate daily
+STATIC_IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DYNAMIC_IMAGE_CACHE_CONTROL = "public, max-age=86400"
+
+
+async def _image_response(request: Request, data: str, fmt: str, cache_control: str) -> Response:
+    """
+    Render (or reuse) the image the query parameters describe. Every invalid
+    render parameter answers 422 with the reason as detail: malformed values,
+    out-of-range sizes, data that does not fit, and a PNG size below the
+    code's module count (QRSizeError).
+    """
+    params = request.query_params
+    try:
+        spec = parse_spec(
+            data,
+            fmt,
+            size=int(params["size"]) if params.get("size") else None,
+            fg=params.get("fg"),
+            bg=params.get("bg"),
+            ec=params.get("ec"),
+            border=int(params["border"]) if params.get("border") else None,
+            compress=params.get("gzip", "").lower() in ("1", "true", "yes"),
+        )
+        rendered = await qr_image_cache.get(spec)
+    except ValueError as exc:
+        # QRRenderError, or a non-numeric size/border
+        detail = str(exc) if isinstance(exc, QRRenderError) else "size and border must be integers"
+        raise HTTPException(status_code=422, detail=detail)
+    headers = {"ETag": rendered.etag, "Cache-Control": cache_control}
+    if rendered.compressed:
+        # Explicitly requested with ?gzip=1, so the URL alone decides the encoding
+        headers["Content-Encoding"] = "gzip"
+    if etag_matches(request.headers.get("if-none-match"), rendered.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rendered.body, media_type=rendered.media_type, headers=headers)
+
+
+@router.get("/qr.png")
+async def qr_png(request: Request, data: str = ""):
+    return await _image_response(request, data, "png", STATIC_IMAGE_CACHE_CONTROL)
+
+
+@router.get("/qr.svg")
+async def qr_svg(request: Request, data: str = ""):
+    return await _image_response(request, data, "svg", STATIC_IMAGE_CACHE_CONTROL)
+
+
+async def _dynamic_image(request: Request, short_code: str, fmt: str, session: AsyncSession) -> Response:
+    # Public like /r/{short_code}: the image only encodes the short link
+    if short_code_cache.get(short_code) is None:
+        qr = await get_qr_by_short_code(session, short_code)
+        if not qr:
+            raise HTTPException(status_code=404, detail="QR not found")
+        short_code_cache.put(short_code, qr.id, qr.destination_url)
+    return await _image_response(request, f"{APP_BASE_URL}/r/{short_code}", fmt, DYNAMIC_IMAGE_CACHE_CONTROL)
+
+
+@router.get("/d/{short_code}/qr.png")
+async def dynamic_qr_png(request: Request, short_code: str, session: AsyncSession = Depends(get_async_session)):
+    return await _dynamic_image(request, short_code, "png", session)
+
+
+@router.get("/d/{short_code}/qr.svg")
+async def dynamic_qr_svg(request: Request, short_code: str, session: AsyncSession = Depends(get_async_session)):
+    return await _dynamic_image(request, short_code, "svg", session)
+
+
+@router.post("/api/d/images.zip")
+async def api_render_qr_batch(
+    request: Request,
+    payload: dict = Body(...),
+    session: AsyncSession = Depends(get_async_session),
+):
+    user_id = get_user_id(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    fmt = str(payload.get("format") or "png")
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=422, detail="format must be png or svg")
+    if payload.get("all"):
+        wanted = None
+    else:
+        wanted = [str(code) for code in payload.get("short_codes") or []]
+        if not wanted:
+            raise HTTPException(status_code=422, detail="short_codes or all is required")
+        if len(wanted) > QR_BATCH_MAX_CODES:
+            raise HTTPException(status_code=422, detail=f"at most {QR_BATCH_MAX_CODES} short codes per batch")
+    codes = await list_user_short_codes(session, user_id, wanted)
+    if len(codes) > QR_BATCH_MAX_CODES:
+        raise HTTPException(status_code=422, detail=f"at most {QR_BATCH_MAX_CODES} short codes per batch")
+    try:
+        entries = [
+            (f"{code}.{fmt}", parse_spec(
+                f"{APP_BASE_URL}/r/{code}",
+                fmt,
+                size=int(payload["size"]) if payload.get("size") else None,
+                fg=payload.get("fg"),
+                bg=payload.get("bg"),
+                ec=payload.get("ec"),
+                border=int(payload["border"]) if payload.get("border") is not None else None,
+            ))
+            for code in codes
+        ]
+    except (QRRenderError, ValueError, TypeError) as exc:
+        detail = str(exc) if isinstance(exc, QRRenderError) else "size and border must be integers"
+        raise HTTPException(status_code=422, detail=detail)
+    missing = sorted(set(wanted) - set(codes)) if wanted is not None else []
+    notes = "".join(f"{code}: not found\n" for code in missing) or None
+
+    job = qr_batch_renderer.try_reserve()
+    if job is None:
+        raise HTTPException(status_code=429, detail="Too many batch renders running; try again shortly",
+                            headers={"Retry-After": "10"})
+    return StreamingResponse(
+        qr_batch_renderer.zip_stream(job, entries, notes),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="qr-codes.zip"'},
+        # Frees the slot even if the client went away before the body started
+        background=BackgroundTask(job.release),
+    )
+
+
+@router.get("/admin/metrics/qr-images")
+async def qr_image_metrics(request: Request):
+    if not request.session.get("admin_id"):
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return {
+        "qr_image_cache": qr_image_cache.stats(),
+        "qr_batch": qr_batch_renderer.stats(),
+        "qr_assets": qr_asset_renderer.stats(),
+    }
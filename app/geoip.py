@@ -0,0 +1,290 @@
+"""
+Offline IP-to-geo lookup backed by a memory-mapped, sorted range index.
+
+The index file is built once from a CSV of IP ranges:
+
+    python -m app.geoip build ranges.csv geo.idx [--format simple|dbip-city]
+
+and loaded by setting GEOIP_DB_PATH. Scans without proxy-provided geo headers
+are enriched inline, and older rows can be filled in with:
+
+    python -m app.geoip backfill [--batch-size 1000]
+
+File layout (native byte order, every section 8-byte aligned):
+    header    magic, byte-order marker, v4 count, v6 count, location count
+    v4        uint32 starts[], uint32 ends[], uint32 location ids[]
+    v6        uint64 starts[], uint64 ends[], uint32 location ids[]
+              (upper 64 bits of the address; /64 is the finest granularity)
+    locations uint32 offsets[count + 1] into a UTF-8 blob of
+              "country\\x1fregion\\x1fcity" records
+"""
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Optional
+import argparse
+import asyncio
+import csv
+import ipaddress
+import mmap
+import os
+import socket
+import struct
+
+_MAGIC = b"QRGEOIDX"
+_BYTE_ORDER_MARK = 0x01020304
+_HEADER = struct.Struct("=8sIIII")
+_SEPARATOR = "\x1f"
+
+GeoLocation = tuple[str, Optional[str], Optional[str]]
+
+
+def _pad(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class GeoIPDatabase:
+    """Read-only view over an index file; lookups binary-search the mapped arrays in place."""
+
+    def __init__(self, path: str, cache_size: int = 65536):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Optional[GeoLocation]]" = OrderedDict()
+        self._locations: dict[int, GeoLocation] = {}
+        self.hits = 0
+        self.misses = 0
+        with open(path, "rb") as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, bom, v4_count, v6_count, loc_count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a geo index file")
+        if bom != _BYTE_ORDER_MARK:
+            raise ValueError(f"{path} was built on a machine with a different byte order")
+        view = memoryview(self._mmap)
+        offset = _pad(_HEADER.size)
+
+        def take(fmt: str, count: int) -> memoryview:
+            nonlocal offset
+            size = count * struct.calcsize(fmt)
+            section = view[offset:offset + size].cast(fmt)
+            offset = _pad(offset + size)
+            return section
+
+        self._v4_starts = take("I", v4_count)
+        self._v4_ends = take("I", v4_count)
+        self._v4_locs = take("I", v4_count)
+        self._v6_starts = take("Q", v6_count)
+        self._v6_ends = take("Q", v6_count)
+        self._v6_locs = take("I", v6_count)
+        self._loc_offsets = take("I", loc_count + 1)
+        self._strings = view[offset:]
+
+    def _location(self, loc_id: int) -> GeoLocation:
+        location = self._locations.get(loc_id)
+        if location is None:
+            raw = bytes(self._strings[self._loc_offsets[loc_id]:self._loc_offsets[loc_id + 1]]).decode("utf-8")
+            country, region, city = raw.split(_SEPARATOR)
+            location = (country, region or None, city or None)
+            self._locations[loc_id] = location
+        return location
+
+    def _search(self, key: int, starts: memoryview, ends: memoryview, locs: memoryview) -> Optional[GeoLocation]:
+        i = bisect_right(starts, key) - 1
+        if i < 0 or key > ends[i]:
+            return None
+        return self._location(locs[i])
+
+    def lookup_uncached(self, ip: str) -> Optional[GeoLocation]:
+        try:
+            packed = socket.inet_pton(socket.AF_INET, ip)
+            return self._search(int.from_bytes(packed, "big"), self._v4_starts, self._v4_ends, self._v4_locs)
+        except (OSError, ValueError):
+            pass
+        try:
+            packed = socket.inet_pton(socket.AF_INET6, ip)
+        except (OSError, ValueError):
+            return None
+        if packed[:12] == b"\x00" * 10 + b"\xff\xff":
+            # IPv4-mapped IPv6 address
+            return self._search(int.from_bytes(packed[12:], "big"), self._v4_starts, self._v4_ends, self._v4_locs)
+        return self._search(int.from_bytes(packed[:8], "big"), self._v6_starts, self._v6_ends, self._v6_locs)
+
+    def lookup(self, ip: str) -> Optional[GeoLocation]:
+        if ip in self._cache:
+            self._cache.move_to_end(ip)
+            self.hits += 1
+            return self._cache[ip]
+        self.misses += 1
+        location = self.lookup_uncached(ip)
+        self._cache[ip] = location
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return location
+
+    def close(self) -> None:
+        for section in (
+            self._v4_starts, self._v4_ends, self._v4_locs,
+            self._v6_starts, self._v6_ends, self._v6_locs,
+            self._loc_offsets, self._strings,
+        ):
+            section.release()
+        self._mmap.close()
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "v4_ranges": len(self._v4_starts),
+            "v6_ranges": len(self._v6_starts),
+            "cache_size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _read_ranges(csv_path: str, fmt: str):
+    with open(csv_path, newline="", encoding="utf-8") as fh:
+        for row in csv.reader(fh):
+            if not row or row[0].startswith("#"):
+                continue
+            if fmt == "dbip-city":
+                if len(row) < 6:
+                    continue
+                # ip_start, ip_end, continent, country, stateprov, city, ...
+                start, end, country, region, city = row[0], row[1], row[3], row[4], row[5]
+            else:
+                # ip_start, ip_end, country[, region[, city]]
+                padded = row + ["", ""]
+                start, end, country, region, city = padded[:5]
+            try:
+                first, last = ipaddress.ip_address(start.strip()), ipaddress.ip_address(end.strip())
+            except ValueError:
+                # header row or junk
+                continue
+            yield first, last, (country.strip(), region.strip(), city.strip())
+
+
+def build_database(csv_path: str, out_path: str, fmt: str = "simple") -> dict:
+    locations: dict[tuple[str, str, str], int] = {}
+    v4: list[tuple[int, int, int]] = []
+    v6: list[tuple[int, int, int]] = []
+    for first, last, location in _read_ranges(csv_path, fmt):
+        if not location[0]:
+            continue
+        loc_id = locations.setdefault(location, len(locations))
+        if first.version == 4:
+            v4.append((int(first), int(last), loc_id))
+        else:
+            v6.append((int(first) >> 64, int(last) >> 64, loc_id))
+
+    def non_overlapping(ranges):
+        ranges.sort()
+        kept = []
+        for start, end, loc_id in ranges:
+            if kept and start <= kept[-1][1]:
+                # Overlap (or sub-/64 IPv6 ranges collapsing together): first range wins
+                continue
+            kept.append((start, end, loc_id))
+        return kept
+
+    v4, v6 = non_overlapping(v4), non_overlapping(v6)
+    blob = bytearray()
+    offsets = array("I", [0])
+    for location in locations:
+        blob += _SEPARATOR.join(location).encode("utf-8")
+        offsets.append(len(blob))
+
+    sections = [
+        array("I", (r[0] for r in v4)), array("I", (r[1] for r in v4)), array("I", (r[2] for r in v4)),
+        array("Q", (r[0] for r in v6)), array("Q", (r[1] for r in v6)), array("I", (r[2] for r in v6)),
+        offsets,
+    ]
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(_HEADER.pack(_MAGIC, _BYTE_ORDER_MARK, len(v4), len(v6), len(locations)))
+        for section in sections:
+            fh.write(b"\x00" * (_pad(fh.tell()) - fh.tell()))
+            section.tofile(fh)
+        fh.write(b"\x00" * (_pad(fh.tell()) - fh.tell()))
+        fh.write(blob)
+    os.replace(tmp_path, out_path)
+    return {"v4_ranges": len(v4), "v6_ranges": len(v6), "locations": len(locations)}
+
+
+_geoip: Optional[GeoIPDatabase] = None
+_geoip_loaded = False
+
+
+def get_geoip() -> Optional[GeoIPDatabase]:
+    """The database configured by GEOIP_DB_PATH, opened on first use; None when not configured."""
+    global _geoip, _geoip_loaded
+    if not _geoip_loaded:
+        _geoip_loaded = True
+        path = os.getenv("GEOIP_DB_PATH")
+        if path and os.path.exists(path):
+            _geoip = GeoIPDatabase(path, cache_size=int(os.getenv("GEOIP_CACHE_SIZE", "65536")))
+    return _geoip
+
+
+async def backfill_scan_geo(database: GeoIPDatabase, batch_size: int = 1000) -> int:
+    """Fill country/region/city on qr_scans rows that have an IP but no country."""
+    from sqlalchemy import select, update
+    from app.db import AsyncSessionLocal
+    from app.models import QRScan
+
+    updated = 0
+    last_id = 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            result = await session.execute(
+                select(QRScan.id, QRScan.ip, QRScan.region, QRScan.city)
+                .where(QRScan.country.is_(None), QRScan.ip.is_not(None), QRScan.id > last_id)
+                .order_by(QRScan.id)
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            params = []
+            for row in rows:
+                location = database.lookup(row.ip)
+                if location is None:
+                    continue
+                country, region, city = location
+                params.append({
+                    "id": row.id,
+                    "country": country,
+                    "region": row.region or region,
+                    "city": row.city or city,
+                })
+            if params:
+                # ORM bulk UPDATE by primary key (one executemany per batch)
+                await session.execute(update(QRScan), params)
+                await session.commit()
+                updated += len(params)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or apply the offline IP-to-geo index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build an index file from a CSV of IP ranges")
+    build.add_argument("csv_path")
+    build.add_argument("out_path")
+    build.add_argument("--format", choices=["simple", "dbip-city"], default="simple")
+    backfill = commands.add_parser("backfill", help="Fill geo columns on existing scans with no country")
+    backfill.add_argument("--db", default=os.getenv("GEOIP_DB_PATH"), help="Index file (defaults to GEOIP_DB_PATH)")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(build_database(args.csv_path, args.out_path, args.format))
+    else:
+        if not args.db:
+            parser.error("--db or GEOIP_DB_PATH is required")
+        database = GeoIPDatabase(args.db)
+        print(f"Updated {asyncio.run(backfill_scan_geo(database, args.batch_size))} scans.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+HyperLogLog cardinality sketches for unique-scanner estimates.
+
+Sketches are fed the 64-bit scan fingerprints from app/scan_dedup.py (already
+uniformly distributed, so no extra hashing) and serialised as small blobs:
+sparse (index, rank) pairs while few registers are set, dense registers
+after that. Merging is a register-wise max, so per-day sketches combine into
+an estimate for any date range.
+"""
+from typing import Iterable, Optional
+import math
+import struct
+
+HLL_PRECISION = 11
+_MASK64 = (1 << 64) - 1
+_DENSE = 1
+_SPARSE = 2
+_SPARSE_ENTRY = struct.Struct(">HB")
+
+
+class HyperLogLog:
+    """Dense-register HLL (2**p one-byte registers); p=11 gives ~2.3% standard error."""
+
+    __slots__ = ("p", "m", "registers")
+
+    def __init__(self, p: int = HLL_PRECISION, registers: Optional[bytearray] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, fingerprint: int) -> None:
+        x = fingerprint & _MASK64
+        index = x >> (64 - self.p)
+        rest = (x << self.p) & _MASK64
+        rank = (64 - self.p + 1) if rest == 0 else (65 - rest.bit_length())
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, fingerprints: Iterable[int]) -> "HyperLogLog":
+        for fingerprint in fingerprints:
+            self.add(fingerprint)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError("cannot merge sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction: linear counting
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_bytes(self) -> bytes:
+        filled = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(filled) * _SPARSE_ENTRY.size < self.m:
+            return bytes((_SPARSE, self.p)) + b"".join(_SPARSE_ENTRY.pack(i, r) for i, r in filled)
+        return bytes((_DENSE, self.p)) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "HyperLogLog":
+        kind, p = blob[0], blob[1]
+        if kind == _DENSE:
+            return cls(p, bytearray(blob[2:]))
+        if kind != _SPARSE:
+            raise ValueError("unknown sketch encoding")
+        sketch = cls(p)
+        for index, rank in _SPARSE_ENTRY.iter_unpack(blob[2:]):
+            sketch.registers[index] = rank
+        return sketch
+
+
+def merge_blobs(blobs: Iterable[bytes], p: int = HLL_PRECISION) -> HyperLogLog:
+    merged = HyperLogLog(p)
+    for blob in blobs:
+        merged.merge(HyperLogLog.from_bytes(blob))
+    return merged
@@ -0,0 +1,115 @@
+"""
+Bounded in-process LRU with an optional TTL, shared by the app's caches
+(short-code resolution, scan stats payloads, rendered QR images, the
+user-agent memo).
+"""
+from collections import OrderedDict
+from time import monotonic
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """
+    LRU bounded by ``max_size``: the entry count, or the total of ``weigh(value)``
+    when a weigher is given (e.g. bytes). Entries older than ``ttl_seconds``
+    are dropped on lookup. Not thread-safe; callers use it from the event loop.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: Optional[float] = None,
+        weigh: Optional[Callable[[V], int]] = None,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._weigh = weigh
+        self._entries: "OrderedDict[Hashable, tuple[V, float]]" = OrderedDict()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _weight(self, value: V) -> int:
+        return self._weigh(value) if self._weigh is not None else 1
+
+    def _drop(self, key: Hashable) -> None:
+        value, _ = self._entries.pop(key)
+        self.weight -= self._weight(value)
+
+    def get(self, key: Hashable, valid: Optional[Callable[[V], bool]] = None) -> Optional[V]:
+        """Cached value or None; ``valid`` can reject an entry (counted as stale) so the caller recomputes it."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        # No clock read for caches without a TTL (the UA memo sits on the redirect path)
+        if self.ttl_seconds is not None and expires_at <= monotonic():
+            self._drop(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        if valid is not None and not valid(value):
+            self._drop(key)
+            self.stale += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Optional[V]:
+        """Live value or None, without counting a lookup or refreshing recency."""
+        entry = self._entries.get(key)
+        if entry is None or (self.ttl_seconds is not None and entry[1] <= monotonic()):
+            return None
+        return entry[0]
+
+    def put(self, key: Hashable, value: V) -> V:
+        weight = self._weight(value)
+        if key in self._entries:
+            self._drop(key)
+        if weight > self.max_size:
+            # Would evict everything and still not fit
+            return value
+        expires_at = monotonic() + self.ttl_seconds if self.ttl_seconds is not None else float("inf")
+        self._entries[key] = (value, expires_at)
+        self.weight += weight
+        while self.weight > self.max_size:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+        return value
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._drop(key)
+        return entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.weight = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale": self.stale,
+        }
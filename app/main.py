@@ -1,7 +1,7 @@
 from fastapi import FastAPI, Request, status, Form, Depends
 from fastapi.templating import Jinja2Templates
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from app.crud_admin import get_admin_by_username
@@ -28,14 +28,37 @@ from app.endpoints_admin_category import router as admin_category_router
 from app.endpoints_admin_tag import router as admin_tag_router
 from app.endpoints_blog import router as blog_router
 from app.endpoints_dynamic_qr import router as dynamic_qr_router
+from app.endpoints_qr import router as qr_router
 from app.endpoints_subscriptions import router as subscriptions_router
 from app.endpoints_webhook import router as webhook_router
+from app.qr_assets import ImmutableStaticFiles, qr_asset_renderer
+from app.qr_batch import qr_batch_renderer
+from app.scan_ingest import scan_ingestor
+from app.short_code_filter import short_code_filter
+from app.short_codes import short_code_allocator
+from contextlib import asynccontextmanager
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail the deploy rather than issue codes under a missing key
+    short_code_allocator.check_configured()
+    scan_ingestor.start()
+    qr_asset_renderer.start()
+    short_code_filter.schedule_rebuild()
+    yield
+    await short_code_filter.stop()
+    await qr_asset_renderer.stop()
+    qr_batch_renderer.shutdown()
+    # Drain queued scans before the worker exits so deploys don't lose them
+    await scan_ingestor.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(SessionMiddleware, secret_key="your-secret-key")
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount("/static", ImmutableStaticFiles(directory="app/static"), name="static")
 
 app.include_router(admin_router)
 app.include_router(tag_router)
@@ -48,6 +71,7 @@ app.include_router(admin_tag_router)
 app.include_router(blog_router)
 app.include_router(seo_router)
 app.include_router(dynamic_qr_router)
+app.include_router(qr_router)
 app.include_router(auth_router)
 app.include_router(subscriptions_router)
 app.include_router(webhook_router)
@@ -77,7 +101,8 @@ async def blog(request: Request):
 async def custom_404_handler(request: Request, exc: StarletteHTTPException):
     if exc.status_code == 404:
         return templates.TemplateResponse("404.html", {"request": request}, status_code=404)
-    raise exc
+    # Re-raising here would turn every other HTTPException into a 500
+    return await http_exception_handler(request, exc)
 
 @app.get("/qradmin")
 async def qradmin_redirect():
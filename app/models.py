@@ -8,6 +8,12 @@ from sqlalchemy import (
     func,
     Boolean,
     Column,
+    BigInteger,
+    Date,
+    Integer,
+    UniqueConstraint,
+    Index,
+    LargeBinary,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db import Base
@@ -165,14 +171,36 @@ class DynamicQR(Base):
     updated_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+    # Denormalised from qr_scans by the scan writers; python -m app.scan_rollup counters rebuilds them
+    scan_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    last_scanned_at: Mapped[DateTime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     scans: Mapped[list["QRScan"]] = relationship(
         "QRScan", back_populates="qr", cascade="all, delete"
     )
 
 
+class ShortCodeSequence(Base):
+    """Single-row counter that short-code blocks are reserved from (see app/short_codes.py)."""
+    __tablename__ = "short_code_sequence"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    next_value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
 class QRScan(Base):
     __tablename__ = "qr_scans"
+    __table_args__ = (
+        # Keyset pagination of a QR's scan log (newest first); also serves (qr_id, scanned_at) ranges
+        Index("ix_qr_scans_qr_id_scanned_at_id", "qr_id", "scanned_at", "id"),
+        # Index-only GROUP BYs over a date range; SQLite has no INCLUDE
+        Index(
+            "ix_qr_scans_qr_id_scanned_at_cover",
+            "qr_id",
+            "scanned_at",
+            postgresql_include=["device", "os", "browser", "country"],
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     qr_id: Mapped[int] = mapped_column(ForeignKey("dynamic_qr.id", ondelete="CASCADE"), index=True)
@@ -192,6 +220,51 @@ class QRScan(Base):
     qr: Mapped["DynamicQR"] = relationship("DynamicQR", back_populates="scans")
 
 
+class QRScanDaily(Base):
+    """Per-day scan counts by device/os/browser/country, kept up to date as scans are written."""
+    __tablename__ = "qr_scan_daily"
+    __table_args__ = (
+        UniqueConstraint("qr_id", "day", "device", "os", "browser", "country", name="uq_qr_scan_daily_key"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # Lookups by qr_id use the unique key's index
+    qr_id: Mapped[int] = mapped_column(ForeignKey("dynamic_qr.id", ondelete="CASCADE"))
+    day: Mapped[Date] = mapped_column(Date, nullable=False)
+    # Missing dimensions are stored as "unknown" so they take part in the unique key
+    device: Mapped[str] = mapped_column(String(50), nullable=False)
+    os: Mapped[str] = mapped_column(String(50), nullable=False)
+    browser: Mapped[str] = mapped_column(String(50), nullable=False)
+    country: Mapped[str] = mapped_column(String(64), nullable=False)
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class QRScanDailyUniques(Base):
+    """HyperLogLog sketch (app/hll.py) of distinct scanner fingerprints for one QR and day."""
+    __tablename__ = "qr_scan_daily_uniques"
+
+    qr_id: Mapped[int] = mapped_column(ForeignKey("dynamic_qr.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[Date] = mapped_column(Date, primary_key=True)
+    sketch: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+
+
+class ScanArchivePart(Base):
+    """One gzip NDJSON file of qr_scans rows moved to cold storage by app/scan_archive.py."""
+    __tablename__ = "scan_archive_parts"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    month: Mapped[str] = mapped_column(String(7), index=True)
+    path: Mapped[str] = mapped_column(String(500), unique=True)
+    first_scan_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    last_scan_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_day: Mapped[Date] = mapped_column(Date, nullable=False)
+    last_day: Mapped[Date] = mapped_column(Date, nullable=False)
+    created_at: Mapped[DateTime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
 # ==================================================
 # Subscriptions
 # ==================================================
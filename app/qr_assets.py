@@ -0,0 +1,187 @@
+"""
+Pre-rendered default images for dynamic QR codes.
+
+A dynamic QR's short link never changes, so its default PNG and SVG can be
+rendered once, right after creation, and served as static files. Files are
+content-addressed by the render spec hash (the same key as the image cache
+and ETag), under the /static mount:
+
+    app/static/qr/<first 2 hex>/<spec hash>.png|.svg
+
+Creation only enqueues the short code; a background task renders in the
+thread pool and writes each file atomically. Pages fall back to the
+/d/{code}/qr.* endpoints until the files exist. Existing QRs can be filled
+in with:
+
+    python -m app.qr_assets backfill
+"""
+from pathlib import Path
+from typing import Optional
+import argparse
+import asyncio
+import logging
+import os
+
+from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.db import AsyncSessionLocal
+from app.models import DynamicQR
+from app.qr_render import QRImageSpec, parse_spec, render_qr
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path("app/static")
+QR_ASSET_SUBDIR = "qr"
+APP_BASE_URL = os.getenv("APP_BASE_URL", "https://qrgenerator.world").rstrip("/")
+# The variants pages embed: the default PNG size from the UI, and a scalable SVG
+DEFAULT_VARIANTS = (("png", 300), ("svg", 300))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _spec(short_code: str, fmt: str, size: int) -> QRImageSpec:
+    return parse_spec(f"{APP_BASE_URL}/r/{short_code}", fmt, size)
+
+
+def asset_relative_path(spec: QRImageSpec) -> str:
+    key = spec.key()
+    return f"{QR_ASSET_SUBDIR}/{key[:2]}/{key}.{spec.fmt}"
+
+
+def asset_url(short_code: str, fmt: str = "png", size: int = 300) -> str:
+    """Static URL of a pre-rendered image, or the rendering endpoint while it is not on disk yet."""
+    relative = asset_relative_path(_spec(short_code, fmt, size))
+    if (STATIC_DIR / relative).is_file():
+        return f"/static/{relative}"
+    return f"/d/{short_code}/qr.{fmt}?size={size}"
+
+
+def write_assets(short_code: str) -> int:
+    """Render and store the default variants that are missing; returns how many files were written."""
+    written = 0
+    for fmt, size in DEFAULT_VARIANTS:
+        spec = _spec(short_code, fmt, size)
+        target = STATIC_DIR / asset_relative_path(spec)
+        if target.is_file():
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(render_qr(spec))
+        os.replace(tmp, target)
+        written += 1
+    return written
+
+
+class QRAssetRenderer:
+    """Queue of short codes to pre-render, drained by one background task."""
+
+    def __init__(self, max_queue: int = 10000):
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Finish what is queued, then stop."""
+        if not self.running:
+            return
+        queue, task = self._queue, self._task
+        self._queue = None
+        await queue.put(None)
+        await task
+        self._task = None
+
+    def enqueue(self, short_code: str) -> bool:
+        # Never blocks creation; without a consumer (scripts) the endpoints render on demand
+        queue = self._queue
+        if queue is None:
+            return False
+        try:
+            queue.put_nowait(short_code)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            short_code = await queue.get()
+            if short_code is None:
+                break
+            try:
+                self.written += await run_in_threadpool(write_assets, short_code)
+            except Exception:
+                self.errors += 1
+                logger.exception("Pre-rendering QR assets for %s failed", short_code)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles whose pre-rendered QR files carry a far-future immutable Cache-Control."""
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        # Content-addressed: a changed image gets a new name, so caches may keep these forever
+        if self.get_path(scope).startswith(QR_ASSET_SUBDIR + "/"):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+qr_asset_renderer = QRAssetRenderer(max_queue=int(os.getenv("QR_ASSET_QUEUE_SIZE", "10000")))
+
+
+async def backfill_assets(batch_size: int = 500) -> int:
+    written = 0
+    last_id = 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            rows = (await session.execute(
+                select(DynamicQR.id, DynamicQR.short_code).where(DynamicQR.id > last_id).order_by(DynamicQR.id).limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for _, short_code in rows:
+                written += await run_in_threadpool(write_assets, short_code)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render default QR images into the static directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="Render missing default images for every dynamic QR")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        print(f"Wrote {asyncio.run(backfill_assets(args.batch_size))} QR image files.")
+
+
+if __name__ == "__main__":
+    main()
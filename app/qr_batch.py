@@ -0,0 +1,169 @@
+"""
+Batch rendering of dynamic QR images into a streamed ZIP.
+
+Renders fan out to a process pool so a batch uses every core, with at most
+``window`` renders in flight; finished images are appended to the archive
+as they complete and the bytes go straight to the client. The ZIP is
+written in streaming mode (data descriptors, no seeking), so memory is
+bounded by the window, not the batch size. Each worker process runs at most
+``max_jobs`` batches at a time; more are turned away with 429.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import asyncio
+import multiprocessing
+import os
+import zipfile
+
+from app.qr_render import QRImageSpec, QRRenderError, qr_image_cache, render_qr
+
+QR_BATCH_MAX_CODES = int(os.getenv("QR_BATCH_MAX_CODES", "5000"))
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class BatchJob:
+    """A reserved batch slot; release() is idempotent so both the stream and the response can call it."""
+
+    def __init__(self, renderer: "BatchRenderer"):
+        self._renderer = renderer
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._renderer.running -= 1
+
+
+class BatchRenderer:
+    def __init__(self, processes: Optional[int] = None, max_jobs: int = 2, window: Optional[int] = None):
+        self.processes = processes or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        # Enough queued work to keep every process busy, little enough to bound memory
+        self.window = window or self.processes * 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.running = 0
+        self.batches = 0
+        self.rejected = 0
+        self.rendered = 0
+        self.cache_hits = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and threads is not safe
+            self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def try_reserve(self) -> Optional[BatchJob]:
+        if self.running >= self.max_jobs:
+            self.rejected += 1
+            return None
+        self.running += 1
+        self.batches += 1
+        return BatchJob(self)
+
+    async def zip_stream(
+        self,
+        job: BatchJob,
+        entries: list[tuple[str, QRImageSpec]],
+        notes: Optional[str] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield a ZIP of (filename, spec) renders in completion order. ``notes``
+        and any entries that could not be rendered become errors.txt.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        sink = _ChunkSink()
+        pending: dict[asyncio.Future, str] = {}
+        failures: list[str] = []
+        try:
+            with zipfile.ZipFile(sink, "w") as archive:
+                timestamp = datetime.now().timetuple()[:6]
+
+                def add(name: str, body: bytes) -> None:
+                    info = zipfile.ZipInfo(name, date_time=timestamp)
+                    # PNG is already deflated; SVG text compresses well
+                    info.compress_type = zipfile.ZIP_STORED if name.endswith(".png") else zipfile.ZIP_DEFLATED
+                    archive.writestr(info, body)
+
+                queue = iter(entries)
+                exhausted = False
+                while True:
+                    while not exhausted and len(pending) < self.window:
+                        item = next(queue, None)
+                        if item is None:
+                            exhausted = True
+                            break
+                        name, spec = item
+                        cached = qr_image_cache.peek(spec)
+                        if cached is not None:
+                            self.cache_hits += 1
+                            add(name, cached.body)
+                            continue
+                        pending[loop.run_in_executor(pool, render_qr, spec)] = name
+                    if not pending:
+                        break
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        name = pending.pop(future)
+                        try:
+                            body = future.result()
+                        except QRRenderError as exc:
+                            # e.g. a PNG size below the module count; the rest of the batch still ships
+                            failures.append(f"{name}: {exc}\n")
+                            continue
+                        add(name, body)
+                        self.rendered += 1
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+                errors = (notes or "") + "".join(failures)
+                if errors:
+                    archive.writestr(zipfile.ZipInfo("errors.txt", date_time=timestamp), errors)
+            yield sink.drain()
+        finally:
+            for future in pending:
+                future.cancel()
+            job.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "processes": self.processes,
+            "window": self.window,
+            "max_jobs": self.max_jobs,
+            "running": self.running,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "rendered": self.rendered,
+            "cache_hits": self.cache_hits,
+        }
+
+
+qr_batch_renderer = BatchRenderer(
+    processes=int(os.getenv("QR_BATCH_PROCESSES", "0")) or None,
+    max_jobs=int(os.getenv("QR_BATCH_MAX_JOBS", "2")),
+)
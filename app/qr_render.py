@@ -0,0 +1,284 @@
+"""
+Server-side QR image rendering (PNG and SVG) with the bundled qrcode library.
+
+Rendered images are content-addressed: the cache key is a hash of everything
+that determines the output bytes (data, format, size, colours, error
+correction, border), so a given URL always yields the same bytes and can be
+served with a strong ETag and a long max-age. Rendering runs in the thread
+pool, and concurrent requests for the same image share one render.
+
+Rendering is two-stage: the encoded module matrix is cached per (data, EC
+level, version), and each size/colour variant is drawn from it. PNGs are
+rasterised with NumPy (np.repeat scaling, a two-colour palette) straight into
+PNG bytes; SVGs are a single path with horizontal runs merged, optionally
+gzipped.
+"""
+from functools import lru_cache
+from hashlib import sha256
+from typing import Optional
+import asyncio
+import gzip
+import io
+import os
+import re
+
+from PIL import Image
+import numpy as np
+import qrcode
+from starlette.concurrency import run_in_threadpool
+
+from app.lru import LRUCache
+
+# Bump when the renderer changes its output, so cached keys and ETags change too
+RENDER_VERSION = 3
+
+QR_DEFAULT_SIZE = 300
+QR_MIN_SIZE = 64
+QR_MAX_SIZE = 2048
+QR_MAX_DATA_LENGTH = 2048
+QR_MAX_BORDER = 16
+QR_MATRIX_CACHE_SIZE = int(os.getenv("QR_MATRIX_CACHE_SIZE", "4096"))
+
+EC_LEVELS = {
+    "L": qrcode.constants.ERROR_CORRECT_L,
+    "M": qrcode.constants.ERROR_CORRECT_M,
+    "Q": qrcode.constants.ERROR_CORRECT_Q,
+    "H": qrcode.constants.ERROR_CORRECT_H,
+}
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+_COLOR = re.compile(r"#?([0-9a-fA-F]{6})")
+
+
+class QRRenderError(ValueError):
+    pass
+
+
+class QRSizeError(QRRenderError):
+    """The requested PNG size is smaller than the code's module count (one pixel per module)."""
+
+
+class QRImageSpec:
+    __slots__ = ("data", "fmt", "size", "fg", "bg", "ec", "border", "compress")
+
+    def __init__(
+        self, data: str, fmt: str, size: int, fg: str, bg: str, ec: str, border: int, compress: bool = False
+    ):
+        self.data = data
+        self.fmt = fmt
+        self.size = size
+        self.fg = fg
+        self.bg = bg
+        self.ec = ec
+        self.border = border
+        self.compress = compress
+
+    def key(self) -> str:
+        canonical = "\x1f".join((
+            str(RENDER_VERSION), self.fmt, str(self.size), self.fg, self.bg, self.ec, str(self.border),
+            "gz" if self.compress else "", self.data,
+        ))
+        return sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _color(value: Optional[str], default: str) -> str:
+    if not value:
+        return default
+    match = _COLOR.fullmatch(value.strip())
+    if match is None:
+        raise QRRenderError("colours must be 6-digit hex, e.g. #1f2937")
+    return "#" + match.group(1).lower()
+
+
+def parse_spec(
+    data: str,
+    fmt: str,
+    size: Optional[int] = None,
+    fg: Optional[str] = None,
+    bg: Optional[str] = None,
+    ec: Optional[str] = None,
+    border: Optional[int] = None,
+    compress: bool = False,
+) -> QRImageSpec:
+    """Validate and normalise request parameters (normalising keeps equivalent URLs on one cache key)."""
+    if not data:
+        raise QRRenderError("data is required")
+    if len(data) > QR_MAX_DATA_LENGTH:
+        raise QRRenderError(f"data is longer than {QR_MAX_DATA_LENGTH} characters")
+    if fmt not in MEDIA_TYPES:
+        raise QRRenderError("format must be png or svg")
+    size = QR_DEFAULT_SIZE if size is None else size
+    if not QR_MIN_SIZE <= size <= QR_MAX_SIZE:
+        raise QRRenderError(f"size must be between {QR_MIN_SIZE} and {QR_MAX_SIZE}")
+    ec = (ec or "H").upper()
+    if ec not in EC_LEVELS:
+        raise QRRenderError("ec must be one of L, M, Q, H")
+    border = 4 if border is None else border
+    if not 0 <= border <= QR_MAX_BORDER:
+        raise QRRenderError(f"border must be between 0 and {QR_MAX_BORDER}")
+    # PNG is already deflated; only SVG is worth gzipping
+    compress = compress and fmt == "svg"
+    return QRImageSpec(data, fmt, size, _color(fg, "#000000"), _color(bg, "#ffffff"), ec, border, compress)
+
+
+@lru_cache(maxsize=QR_MATRIX_CACHE_SIZE)
+def encode_matrix(data: str, ec: str, version: Optional[int] = None) -> np.ndarray:
+    """
+    Boolean module matrix (True = dark, no quiet zone) for data at an EC level.
+
+    Encoding and mask selection are most of a render's cost and do not depend
+    on size or colours, so every style variant of the same code shares one
+    encode. The array is read-only because it is shared.
+    """
+    qr = qrcode.QRCode(version=version, error_correction=EC_LEVELS[ec], border=0)
+    qr.add_data(data)
+    try:
+        qr.make(fit=version is None)
+    except (qrcode.exceptions.DataOverflowError, ValueError):
+        raise QRRenderError("data does not fit in a QR code at this error correction level")
+    matrix = np.array(qr.modules, dtype=bool)
+    matrix.setflags(write=False)
+    return matrix
+
+
+def _rgb(color: str) -> list[int]:
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+
+
+def rasterize_png(matrix: np.ndarray, spec: QRImageSpec) -> bytes:
+    """
+    PNG bytes for a module matrix at the spec's size, colours and border.
+
+    Every module gets the same whole number of pixels, so a size below the
+    module count (quiet zone included) is rejected with QRSizeError rather
+    than drawn larger than asked or downscaled past scannability.
+    """
+    modules = np.pad(matrix, spec.border)
+    if spec.size < modules.shape[0]:
+        raise QRSizeError(
+            f"size {spec.size} is smaller than the {modules.shape[0]} modules this code needs; "
+            f"use at least {modules.shape[0]} or SVG"
+        )
+    # Whole pixels per module keep edges crisp; leftover pixels become extra margin
+    box = spec.size // modules.shape[0]
+    pixels = np.repeat(np.repeat(modules, box, axis=0), box, axis=1).view(np.uint8)
+    if pixels.shape[0] < spec.size:
+        before = (spec.size - pixels.shape[0]) // 2
+        after = spec.size - pixels.shape[0] - before
+        pixels = np.pad(pixels, ((before, after), (before, after)))
+    # Two-entry palette (0 = background, 1 = foreground) written as a 1-bit PNG
+    image = Image.fromarray(pixels, mode="P")
+    image.putpalette(_rgb(spec.bg) + _rgb(spec.fg))
+    out = io.BytesIO()
+    image.save(out, format="PNG", bits=1)
+    return out.getvalue()
+
+
+def svg_path(matrix: np.ndarray, border: int = 0) -> str:
+    """
+    Path data for the dark modules with each horizontal run merged into one
+    rectangle. Every move after the first is relative, so coordinates stay one
+    or two digits long.
+    """
+    # Run starts/ends per row from the edges of the padded row
+    padded = np.zeros((matrix.shape[0], matrix.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = matrix
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    ends = np.nonzero(edges == -1)[1]
+    parts = []
+    x = y = None
+    for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist()):
+        width = end - start
+        if x is None:
+            parts.append(f"M{start + border} {row + border}h{width}v1h-{width}z")
+        else:
+            # After "z" the current point is back at the previous run's start
+            parts.append(f"m{start - x} {row - y}h{width}v1h-{width}z")
+        x, y = start, row
+    return "".join(parts)
+
+
+def svg_document(matrix: np.ndarray, spec: QRImageSpec) -> bytes:
+    """SVG bytes (gzipped if the spec asks) for a module matrix."""
+    extent = matrix.shape[0] + 2 * spec.border
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{spec.size}" height="{spec.size}" '
+        f'viewBox="0 0 {extent} {extent}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="{spec.bg}"/>'
+        f'<path fill="{spec.fg}" d="{svg_path(matrix, spec.border)}"/></svg>'
+    ).encode("utf-8")
+    # mtime=0 keeps the bytes (and so the ETag) stable across renders
+    return gzip.compress(svg, compresslevel=6, mtime=0) if spec.compress else svg
+
+
+def render_qr(spec: QRImageSpec) -> bytes:
+    matrix = encode_matrix(spec.data, spec.ec)
+    return rasterize_png(matrix, spec) if spec.fmt == "png" else svg_document(matrix, spec)
+
+
+class RenderedQR:
+    __slots__ = ("body", "etag", "media_type", "compressed")
+
+    def __init__(self, key: str, body: bytes, media_type: str, compressed: bool = False):
+        self.body = body
+        self.etag = '"' + key[:32] + '"'
+        self.media_type = media_type
+        self.compressed = compressed
+
+
+class QRImageCache:
+    """LRU of rendered images bounded by total bytes; the key is the spec hash."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self._cache: LRUCache[RenderedQR] = LRUCache(max_bytes, weigh=lambda rendered: len(rendered.body))
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.renders = 0
+        self.shared_renders = 0
+
+    def peek(self, spec: QRImageSpec) -> Optional[RenderedQR]:
+        """Cached render or None; does not count as a lookup or refresh recency."""
+        return self._cache.peek(spec.key())
+
+    async def get(self, spec: QRImageSpec) -> RenderedQR:
+        key = spec.key()
+        rendered = self._cache.get(key)
+        if rendered is not None:
+            return rendered
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # Same image already rendering for another request: wait for it
+            self.shared_renders += 1
+            return await asyncio.shield(pending)
+        pending = asyncio.get_running_loop().create_future()
+        self._inflight[key] = pending
+        try:
+            body = await run_in_threadpool(render_qr, spec)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as exc:
+            pending.set_exception(exc)
+            # Nobody else may be waiting; don't leave an unretrieved exception behind
+            pending.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        self.renders += 1
+        rendered = RenderedQR(key, body, MEDIA_TYPES[spec.fmt], spec.compress)
+        self._cache.put(key, rendered)
+        pending.set_result(rendered)
+        return rendered
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        # Bounded by bytes, not entries
+        stats["max_bytes"] = stats.pop("max_size")
+        stats["bytes"] = self._cache.weight
+        return {**stats, "renders": self.renders, "shared_renders": self.shared_renders}
+
+
+qr_image_cache = QRImageCache(max_bytes=int(os.getenv("QR_IMAGE_CACHE_BYTES", str(32 * 1024 * 1024))))
@@ -0,0 +1,50 @@
+"""
+In-process cache for resolving short codes on the /r/{short_code} redirect path.
+"""
+from typing import Optional
+import os
+
+from app.lru import LRUCache
+
+
+class ResolvedShortCode:
+    __slots__ = ("qr_id", "destination_url")
+
+    def __init__(self, qr_id: int, destination_url: str):
+        self.qr_id = qr_id
+        self.destination_url = destination_url
+
+
+class ShortCodeCache:
+    """
+    Bounded LRU of short_code -> (qr_id, destination_url) with a TTL.
+
+    Entries are invalidated locally when a destination changes; the TTL bounds
+    how long other worker processes may keep serving the previous destination.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 60.0):
+        self._cache: LRUCache[ResolvedShortCode] = LRUCache(max_size, ttl_seconds)
+        self.invalidations = 0
+
+    def get(self, short_code: str) -> Optional[ResolvedShortCode]:
+        return self._cache.get(short_code)
+
+    def put(self, short_code: str, qr_id: int, destination_url: str) -> ResolvedShortCode:
+        return self._cache.put(short_code, ResolvedShortCode(qr_id, destination_url))
+
+    def invalidate(self, short_code: str) -> None:
+        if self._cache.pop(short_code) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "invalidations": self.invalidations}
+
+
+short_code_cache = ShortCodeCache(
+    max_size=int(os.getenv("SHORT_CODE_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("SHORT_CODE_CACHE_TTL_SECONDS", "60")),
+)
@@ -0,0 +1,198 @@
+"""
+Retention for raw scans: rows older than SCAN_RETENTION_DAYS move out of
+qr_scans into gzip NDJSON files, partitioned by month, under SCAN_ARCHIVE_DIR:
+
+    <archive dir>/<YYYY-MM>/scans-<first id>-<last id>.ndjson.gz
+
+    python -m app.scan_archive archive [--older-than-days N] [--batch-size 10000] [--dry-run]
+    python -m app.scan_archive list
+    python -m app.scan_archive restore YYYY-MM
+
+Each batch is written and fsynced first. Then, in one transaction, it is
+recorded in scan_archive_parts and deleted from qr_scans, so a crash never
+loses rows (at worst a batch is archived twice and restore skips the
+duplicate ids). The cutoff is a UTC midnight, so a day is either fully
+archived or not at all.
+
+The qr_scan_daily rollup and unique-scanner sketches are left alone, so
+dashboard history stays complete. The rollup backfill does not rebuild days
+covered by archive parts.
+Restoring a month puts its rows back into qr_scans (without counting them
+again) and removes its parts; raise the retention first or the next archive
+run moves them out again.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+import argparse
+import asyncio
+import gzip
+import json
+import os
+
+from sqlalchemy import delete, func, select
+
+from app.crud_dynamic_qr import dialect_insert
+from app.db import AsyncSessionLocal
+from app.models import DynamicQR, QRScan, ScanArchivePart
+
+SCAN_ARCHIVE_DIR = os.getenv("SCAN_ARCHIVE_DIR", "archive/scans")
+SCAN_RETENTION_DAYS = int(os.getenv("SCAN_RETENTION_DAYS", "180"))
+
+_COLUMNS = (
+    "id", "qr_id", "scanned_at", "ip", "country", "region", "city",
+    "user_agent", "device", "os", "browser", "referrer",
+)
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive UTC timestamps
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def archive_cutoff(older_than_days: int, now: Optional[datetime] = None) -> datetime:
+    today = (now or datetime.now(timezone.utc)).date()
+    return datetime.combine(today - timedelta(days=older_than_days), time.min, tzinfo=timezone.utc)
+
+
+def _write_part(root: Path, month: str, rows: list[dict]) -> str:
+    relative = f"{month}/scans-{rows[0]['id']}-{rows[-1]['id']}.ndjson.gz"
+    target = root / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9, mtime=0) as fh:
+            for row in rows:
+                fh.write(json.dumps(row, separators=(",", ":")).encode("utf-8") + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, target)
+    return relative
+
+
+async def archive_scans(
+    older_than_days: int = SCAN_RETENTION_DAYS,
+    batch_size: int = 10000,
+    archive_dir: str = SCAN_ARCHIVE_DIR,
+    dry_run: bool = False,
+) -> dict:
+    """Move scans older than the cutoff to month files; returns counts."""
+    cutoff = archive_cutoff(older_than_days)
+    root = Path(archive_dir)
+    archived = parts = 0
+    last_id = 0
+    async with AsyncSessionLocal() as session:
+        if dry_run:
+            pending = await session.execute(select(func.count(QRScan.id)).where(QRScan.scanned_at < cutoff))
+            return {"cutoff": cutoff.isoformat(), "would_archive": pending.scalar_one()}
+        while True:
+            result = await session.execute(
+                select(*(getattr(QRScan, column) for column in _COLUMNS))
+                .where(QRScan.scanned_at < cutoff, QRScan.id > last_id)
+                .order_by(QRScan.id)
+                .limit(batch_size)
+            )
+            batch = result.all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            by_month: dict[str, list[dict]] = defaultdict(list)
+            for row in batch:
+                record = dict(zip(_COLUMNS, row))
+                scanned_at = _utc(record["scanned_at"])
+                record["scanned_at"] = scanned_at.isoformat()
+                by_month[scanned_at.strftime("%Y-%m")].append(record)
+            for month, rows in by_month.items():
+                days = [datetime.fromisoformat(r["scanned_at"]).date() for r in rows]
+                session.add(ScanArchivePart(
+                    month=month,
+                    path=_write_part(root, month, rows),
+                    first_scan_id=rows[0]["id"],
+                    last_scan_id=rows[-1]["id"],
+                    row_count=len(rows),
+                    first_day=min(days),
+                    last_day=max(days),
+                ))
+            await session.execute(delete(QRScan).where(QRScan.id.in_([row.id for row in batch])))
+            await session.commit()
+            archived += len(batch)
+            parts += len(by_month)
+    return {"cutoff": cutoff.isoformat(), "archived": archived, "parts": parts}
+
+
+async def archived_through() -> Optional[date]:
+    """Last day covered by an archive part; raw scans up to it may be incomplete."""
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(func.max(ScanArchivePart.last_day)))).scalar_one_or_none()
+
+
+async def list_parts() -> list[dict]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(ScanArchivePart.month, func.count(ScanArchivePart.id), func.sum(ScanArchivePart.row_count))
+            .group_by(ScanArchivePart.month)
+            .order_by(ScanArchivePart.month)
+        )
+        return [{"month": month, "parts": n, "rows": rows} for month, n, rows in result]
+
+
+async def restore_month(month: str, archive_dir: str = SCAN_ARCHIVE_DIR, chunk_size: int = 500) -> dict:
+    """Load a month's parts back into qr_scans (rollups already count them) and drop the parts."""
+    root = Path(archive_dir)
+    restored = skipped = 0
+    async with AsyncSessionLocal() as session:
+        parts = list((await session.execute(
+            select(ScanArchivePart).where(ScanArchivePart.month == month).order_by(ScanArchivePart.first_scan_id)
+        )).scalars())
+        for part in parts:
+            with gzip.open(root / part.path, "rt", encoding="utf-8") as fh:
+                rows = [json.loads(line) for line in fh]
+            # QRs deleted since archiving would fail the foreign key
+            qr_ids = {row["qr_id"] for row in rows}
+            live = set((await session.execute(select(DynamicQR.id).where(DynamicQR.id.in_(qr_ids)))).scalars())
+            keep = []
+            for row in rows:
+                if row["qr_id"] not in live:
+                    skipped += 1
+                    continue
+                row["scanned_at"] = datetime.fromisoformat(row["scanned_at"])
+                keep.append(row)
+            for start in range(0, len(keep), chunk_size):
+                await session.execute(
+                    dialect_insert(session, QRScan)
+                    .values(keep[start:start + chunk_size])
+                    .on_conflict_do_nothing(index_elements=["id"])
+                )
+            await session.delete(part)
+            await session.commit()
+            (root / part.path).unlink(missing_ok=True)
+            restored += len(keep)
+    return {"month": month, "parts": len(parts), "restored": restored, "skipped_deleted_qrs": skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old raw scans to compressed month files, or restore them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive = commands.add_parser("archive", help="Move scans past the retention age to the archive")
+    archive.add_argument("--older-than-days", type=int, default=SCAN_RETENTION_DAYS)
+    archive.add_argument("--batch-size", type=int, default=10000, help="Rows written and deleted per transaction")
+    archive.add_argument("--archive-dir", default=SCAN_ARCHIVE_DIR)
+    archive.add_argument("--dry-run", action="store_true", help="Only count the rows that would move")
+    commands.add_parser("list", help="Show archived months")
+    restore = commands.add_parser("restore", help="Load an archived month back into qr_scans")
+    restore.add_argument("month", help="YYYY-MM")
+    restore.add_argument("--archive-dir", default=SCAN_ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        print(asyncio.run(archive_scans(args.older_than_days, args.batch_size, args.archive_dir, args.dry_run)))
+    elif args.command == "list":
+        for entry in asyncio.run(list_parts()):
+            print(f"{entry['month']}  {entry['parts']} parts  {entry['rows']} rows")
+    else:
+        print(asyncio.run(restore_month(args.month, args.archive_dir)))
+
+
+if __name__ == "__main__":
+    main()
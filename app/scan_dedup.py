@@ -0,0 +1,192 @@
+"""
+De-duplication of rapid repeat scans (browser double-fetch, refresh storms).
+"""
+from hashlib import blake2b
+from time import monotonic, time
+from typing import Optional
+import os
+import sqlite3
+
+
+def scan_fingerprint(short_code: str, ip: str, user_agent: str) -> int:
+    """Fixed-size (signed 64-bit) fingerprint of a scanning client for one short code."""
+    raw = f"{short_code}\x00{ip}\x00{user_agent[:64]}".encode("utf-8", "surrogatepass")
+    return int.from_bytes(blake2b(raw, digest_size=8).digest(), "big", signed=True)
+
+
+class TimeWheelDeduplicator:
+    """
+    Remembers fingerprints for ``ttl_seconds`` using a ring of time buckets.
+
+    Each bucket covers ``ttl_seconds / slots`` seconds. Advancing the wheel
+    clears only the buckets that fell out of the window, so expiry costs O(1)
+    amortized per recorded scan. ``max_entries`` is a hard cap: when reached,
+    the oldest bucket is evicted early.
+    """
+
+    def __init__(self, ttl_seconds: float = 5.0, slots: int = 10, max_entries: int = 100000):
+        self.ttl_seconds = ttl_seconds
+        self.slots = slots
+        self.max_entries = max_entries
+        self._width = ttl_seconds / slots
+        # One extra bucket so a bucket is only reused once all its entries are past the TTL
+        self._ring: list[list[int]] = [[] for _ in range(slots + 1)]
+        self._seen: dict[int, float] = {}
+        self._tick: Optional[int] = None
+        self.duplicates = 0
+        self.recorded = 0
+        self.expired = 0
+        self.forced_evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _sweep(self, bucket: list[int], cutoff: float) -> int:
+        seen = self._seen
+        removed = 0
+        for fp in bucket:
+            last = seen.get(fp)
+            # Skip fingerprints that were recorded again into a newer bucket
+            if last is not None and last < cutoff:
+                del seen[fp]
+                removed += 1
+        bucket.clear()
+        return removed
+
+    def _advance(self, now: float) -> int:
+        tick = int(now / self._width)
+        if self._tick is None:
+            self._tick = tick
+            return tick
+        ring_size = len(self._ring)
+        steps = min(tick - self._tick, ring_size)
+        for step in range(steps, 0, -1):
+            reused = tick - step + 1
+            self.expired += self._sweep(self._ring[reused % ring_size], (reused - self.slots) * self._width)
+        self._tick = max(self._tick, tick)
+        return self._tick
+
+    def _evict_oldest(self) -> None:
+        ring_size = len(self._ring)
+        for age in range(self.slots, -1, -1):
+            tick = self._tick - age
+            bucket = self._ring[tick % ring_size]
+            if bucket:
+                self.forced_evictions += self._sweep(bucket, (tick + 1) * self._width)
+                if len(self._seen) < self.max_entries:
+                    return
+
+    def is_duplicate(self, fingerprint: int, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = monotonic()
+        self._advance(now)
+        last = self._seen.get(fingerprint)
+        return last is not None and (now - last) < self.ttl_seconds
+
+    def mark(self, fingerprint: int, now: Optional[float] = None, record: bool = True) -> None:
+        """Remember a fingerprint; ``record=False`` remembers a duplicate seen elsewhere without counting it."""
+        if now is None:
+            now = monotonic()
+        tick = self._advance(now)
+        if fingerprint not in self._seen and len(self._seen) >= self.max_entries:
+            self._evict_oldest()
+        self._seen[fingerprint] = now
+        self._ring[tick % len(self._ring)].append(fingerprint)
+        if record:
+            self.recorded += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._seen),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "recorded": self.recorded,
+            "duplicates": self.duplicates,
+            "expired": self.expired,
+            "forced_evictions": self.forced_evictions,
+        }
+
+
+class SQLiteDedupBackend:
+    """
+    Fingerprint store in a local SQLite file so several uvicorn workers on one
+    host share de-duplication state. Durability is deliberately relaxed: the
+    data is only useful for a few seconds.
+
+    Calls run inline on the event loop, so they never wait for the lock
+    (busy timeout 0): a worker that finds the file locked gets an immediate
+    sqlite3.OperationalError and falls back to its local wheel.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 5.0, prune_interval: float = 1.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.prune_interval = prune_interval
+        self._conn = sqlite3.connect(path, timeout=0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recent_scans (fp INTEGER PRIMARY KEY, seen_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_recent_scans_seen_at ON recent_scans (seen_at)")
+        self._next_prune = 0.0
+        self.errors = 0
+
+    def check_and_set(self, fingerprint: int, now: Optional[float] = None) -> bool:
+        """Atomically record the fingerprint; return False if another worker saw it within the TTL."""
+        if now is None:
+            now = time()
+        cursor = self._conn.execute(
+            "INSERT INTO recent_scans (fp, seen_at) VALUES (?, ?) "
+            "ON CONFLICT(fp) DO UPDATE SET seen_at = excluded.seen_at WHERE recent_scans.seen_at <= ?",
+            (fingerprint, now, now - self.ttl_seconds),
+        )
+        recorded = cursor.rowcount == 1
+        if now >= self._next_prune:
+            self._next_prune = now + self.prune_interval
+            self._conn.execute("DELETE FROM recent_scans WHERE seen_at <= ?", (now - self.ttl_seconds,))
+        return recorded
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class ScanDeduplicator:
+    def __init__(self, local: TimeWheelDeduplicator, shared: Optional[SQLiteDedupBackend] = None):
+        self.local = local
+        self.shared = shared
+
+    def should_record(self, fingerprint: int) -> bool:
+        now = monotonic()
+        if self.local.is_duplicate(fingerprint, now):
+            self.local.duplicates += 1
+            return False
+        if self.shared is not None:
+            try:
+                if not self.shared.check_and_set(fingerprint):
+                    self.local.duplicates += 1
+                    # Repeats from this client are then answered locally, without touching SQLite
+                    self.local.mark(fingerprint, now, record=False)
+                    return False
+            except sqlite3.Error:
+                # Locked (never waited for) or unavailable file: fall back to per-process de-duplication
+                self.shared.errors += 1
+        self.local.mark(fingerprint, now)
+        return True
+
+    def stats(self) -> dict:
+        stats = self.local.stats()
+        stats["shared_backend"] = self.shared.path if self.shared is not None else None
+        stats["shared_errors"] = self.shared.errors if self.shared is not None else 0
+        return stats
+
+
+def _build_deduplicator() -> ScanDeduplicator:
+    ttl = float(os.getenv("SCAN_DEDUP_TTL_SECONDS", "5"))
+    local = TimeWheelDeduplicator(ttl_seconds=ttl, max_entries=int(os.getenv("SCAN_DEDUP_MAX_ENTRIES", "100000")))
+    shared_path = os.getenv("SCAN_DEDUP_SQLITE_PATH")
+    shared = SQLiteDedupBackend(shared_path, ttl_seconds=ttl) if shared_path else None
+    return ScanDeduplicator(local, shared)
+
+
+scan_deduplicator = _build_deduplicator()
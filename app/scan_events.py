@@ -0,0 +1,147 @@
+"""
+In-process pub/sub of new scans, feeding the live Server-Sent Events stream
+on the QR detail page.
+
+The redirect path publishes one small event per recorded scan; publishing
+never blocks. Each subscriber has a bounded buffer, and a subscriber that
+falls ``buffer_size`` events behind is dropped: its stream ends with a
+``dropped`` event and the page falls back to a reload.
+
+Events only reach subscribers connected to the same process, so with several
+workers a page sees the scans that hit its own worker. Put the redirects and
+the event stream behind one worker, or swap this broker for one backed by
+PostgreSQL LISTEN/NOTIFY or Redis, if that matters.
+"""
+from typing import AsyncIterator, Optional
+import asyncio
+import json
+import os
+
+from app.crud_dynamic_qr import rollup_key
+
+
+class _Subscription:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+
+class ScanEventBroker:
+    def __init__(self, buffer_size: int = 256, max_subscribers: int = 1000, keepalive: float = 15.0):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.keepalive = keepalive
+        self._subscribers: dict[int, set[_Subscription]] = {}
+        self._count = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+        self.rejected = 0
+
+    def has_subscribers(self, qr_id: int) -> bool:
+        return qr_id in self._subscribers
+
+    def publish(self, qr_id: int, event: dict) -> None:
+        subscribers = self._subscribers.get(qr_id)
+        if not subscribers:
+            return
+        self.published += 1
+        for subscription in list(subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # Slow consumer: cut it loose rather than buffer without bound
+                subscription.dropped = True
+                self._remove(qr_id, subscription)
+                self.dropped_subscribers += 1
+
+    def has_capacity(self) -> bool:
+        """Room for one more subscriber; endpoints check this before starting a stream, to answer 503."""
+        if self._count >= self.max_subscribers:
+            self.rejected += 1
+            return False
+        return True
+
+    def subscribe(self, qr_id: int) -> Optional[_Subscription]:
+        if self._count >= self.max_subscribers:
+            self.rejected += 1
+            return None
+        subscription = _Subscription(self.buffer_size)
+        self._subscribers.setdefault(qr_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def _remove(self, qr_id: int, subscription: _Subscription) -> None:
+        subscribers = self._subscribers.get(qr_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        self._count -= 1
+        if not subscribers:
+            del self._subscribers[qr_id]
+
+    async def stream(self, qr_id: int) -> AsyncIterator[str]:
+        """
+        SSE body for one subscriber; unsubscribes when the client goes away.
+
+        The subscription is registered on the first iteration, not when the
+        response is built: a client that disconnects before the body starts
+        never runs the generator, so nothing would release a subscription
+        taken earlier.
+        """
+        subscription = self.subscribe(qr_id)
+        if subscription is None:
+            # Filled up since the endpoint's capacity check
+            yield "event: dropped\ndata: {}\n\n"
+            return
+        try:
+            yield f"retry: {int(self.keepalive * 1000)}\n\n"
+            while True:
+                # Only an empty queue can block, and a full one is what drops a subscriber
+                if subscription.dropped and subscription.queue.empty():
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    # Comment line: keeps proxies from timing out the idle connection
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: scan\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+        finally:
+            self._remove(qr_id, subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self._count,
+            "qrs_watched": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "buffer_size": self.buffer_size,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+            "rejected": self.rejected,
+        }
+
+
+def scan_event(row: dict) -> dict:
+    """Event payload for a scan row, with labels normalised like the rollup so charts can add to them."""
+    _, day, device, os_name, browser, country = rollup_key(row)
+    scanned_at = row.get("scanned_at")
+    return {
+        "scanned_at": scanned_at.isoformat() if scanned_at is not None else None,
+        "day": day.isoformat(),
+        "device": device,
+        "os": os_name,
+        "browser": browser,
+        "country": country,
+    }
+
+
+scan_event_broker = ScanEventBroker(
+    buffer_size=int(os.getenv("SCAN_EVENTS_BUFFER", "256")),
+    max_subscribers=int(os.getenv("SCAN_EVENTS_MAX_SUBSCRIBERS", "1000")),
+)
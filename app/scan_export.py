@@ -0,0 +1,113 @@
+"""
+Streaming export of raw scan rows as CSV or NDJSON, optionally gzipped.
+
+Rows are read through a server-side cursor in ``yield_per`` partitions and
+encoded one partition at a time, so memory stays flat whatever the row count.
+"""
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+from app.db import AsyncSessionLocal
+from app.models import DynamicQR, QRScan
+
+EXPORT_PARTITION_ROWS = 1000
+
+EXPORT_FIELDS = (
+    "short_code",
+    "scanned_at",
+    "ip",
+    "country",
+    "region",
+    "city",
+    "device",
+    "os",
+    "browser",
+    "referrer",
+    "user_agent",
+)
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def _export_query(user_id: int, qr_id: Optional[int], since: Optional[datetime], until: Optional[datetime]):
+    query = (
+        select(
+            DynamicQR.short_code,
+            QRScan.scanned_at,
+            QRScan.ip,
+            QRScan.country,
+            QRScan.region,
+            QRScan.city,
+            QRScan.device,
+            QRScan.os,
+            QRScan.browser,
+            QRScan.referrer,
+            QRScan.user_agent,
+        )
+        .join(DynamicQR, DynamicQR.id == QRScan.qr_id)
+        .where(DynamicQR.user_id == user_id)
+    )
+    if qr_id is not None:
+        query = query.where(QRScan.qr_id == qr_id)
+    if since is not None:
+        query = query.where(QRScan.scanned_at >= since)
+    if until is not None:
+        query = query.where(QRScan.scanned_at < until)
+    # Walks the (qr_id, scanned_at, id) index
+    return query.order_by(QRScan.qr_id, QRScan.scanned_at, QRScan.id)
+
+
+def _timestamp(value) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _encode_csv(rows) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    for row in rows:
+        writer.writerow((row[0], _timestamp(row[1])) + tuple(row[2:]))
+    return out.getvalue()
+
+
+def _encode_ndjson(rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, (row[0], _timestamp(row[1])) + tuple(row[2:])))) + "\n"
+        for row in rows
+    )
+
+
+async def export_scans(
+    user_id: int,
+    fmt: str = "csv",
+    qr_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """Yield the export body in chunks; opens its own session because it outlives the request's."""
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor is not None else data
+
+    if fmt == "csv":
+        yield emit(",".join(EXPORT_FIELDS) + "\r\n")
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            _export_query(user_id, qr_id, since, until).execution_options(yield_per=EXPORT_PARTITION_ROWS)
+        )
+        async for rows in result.partitions():
+            chunk = emit(encode(rows))
+            # The compressor buffers small inputs; skip empty writes
+            if chunk:
+                yield chunk
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,218 @@
+"""
+Batched scan ingestion: the redirect path enqueues scans and a background
+consumer writes them with multi-row INSERTs.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.db import AsyncSessionLocal
+from app.crud_dynamic_qr import merge_scan_uniques, record_scans_bulk
+
+logger = logging.getLogger(__name__)
+
+
+class ScanRecord:
+    __slots__ = (
+        "qr_id",
+        "scanned_at",
+        "ip",
+        "country",
+        "region",
+        "city",
+        "user_agent",
+        "device",
+        "os",
+        "browser",
+        "referrer",
+        "fingerprint",
+    )
+    # Columns of qr_scans; fingerprint only feeds the unique-scanner sketches
+    _COLUMNS = __slots__[:-1]
+
+    def __init__(
+        self,
+        qr_id: int,
+        ip: Optional[str],
+        country: Optional[str],
+        region: Optional[str],
+        city: Optional[str],
+        user_agent: Optional[str],
+        device: Optional[str],
+        os: Optional[str],
+        browser: Optional[str],
+        referrer: Optional[str],
+        scanned_at: Optional[datetime] = None,
+        fingerprint: Optional[int] = None,
+    ):
+        self.qr_id = qr_id
+        self.scanned_at = scanned_at or datetime.now(timezone.utc)
+        self.ip = ip
+        self.country = country
+        self.region = region
+        self.city = city
+        self.user_agent = user_agent
+        self.device = device
+        self.os = os
+        self.browser = browser
+        self.referrer = referrer
+        self.fingerprint = fingerprint
+
+    def as_row(self) -> dict:
+        return {name: getattr(self, name) for name in self._COLUMNS}
+
+
+_STOP = object()
+
+
+class ScanIngestor:
+    """
+    Bounded asyncio queue drained by a single consumer task.
+
+    A batch is flushed once it reaches ``batch_size`` records or
+    ``flush_interval`` seconds after its first record, whichever comes first.
+    When the queue is full, ``submit`` waits up to ``enqueue_timeout`` seconds
+    for space (backpressure) and then drops the scan, counting it.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.05,
+        flush_attempts: int = 3,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.flush_attempts = flush_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.overflows = 0
+        self.dropped = 0
+        self.flush_errors = 0
+        self.direct_writes = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop accepting work and flush everything already queued."""
+        if not self.running:
+            return
+        queue, task = self._queue, self._task
+        self._queue = None
+        await queue.put(_STOP)
+        await task
+        self._task = None
+
+    async def submit(self, record: ScanRecord) -> bool:
+        queue = self._queue
+        if queue is None or not self.running:
+            # No consumer (e.g. scripts or shutdown): write straight through
+            self.direct_writes += 1
+            return await self._flush([record])
+        try:
+            queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            try:
+                await asyncio.wait_for(queue.put(record), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+        # Producers that were blocked on a full queue may land after the stop marker
+        leftovers = []
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            await self._flush(leftovers)
+
+    async def _flush(self, batch: list) -> bool:
+        rows = [record.as_row() for record in batch]
+        uniques = [
+            (record.qr_id, record.scanned_at, record.fingerprint) for record in batch if record.fingerprint is not None
+        ]
+        for attempt in range(1, self.flush_attempts + 1):
+            try:
+                async with AsyncSessionLocal() as session:
+                    await record_scans_bulk(session, rows, commit=False)
+                    await merge_scan_uniques(session, uniques, commit=False)
+                    await session.commit()
+            except Exception:
+                self.flush_errors += 1
+                logger.exception("Scan batch flush failed (attempt %d/%d)", attempt, self.flush_attempts)
+                if attempt < self.flush_attempts:
+                    await asyncio.sleep(0.2 * attempt)
+                continue
+            self.written += len(rows)
+            self.batches += 1
+            return True
+        self.dropped += len(rows)
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "overflows": self.overflows,
+            "dropped": self.dropped,
+            "flush_errors": self.flush_errors,
+            "direct_writes": self.direct_writes,
+        }
+
+
+scan_ingestor = ScanIngestor(
+    max_queue=int(os.getenv("SCAN_INGEST_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("SCAN_INGEST_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("SCAN_INGEST_FLUSH_SECONDS", "1.0")),
+)
@@ -0,0 +1,153 @@
+"""
+Backfill of the qr_scan_daily rollup from raw qr_scans rows, and of the
+per-QR scan counters.
+
+New scans update the rollup, the unique-scanner sketches and the counters as
+they are written (see ScanIngestor._flush); this recomputes them for existing
+history, QR by QR:
+
+    python -m app.scan_rollup backfill [--batch-size 200] [--qr-id ID]
+    python -m app.scan_rollup counters [--batch-size 1000] [--qr-id ID]
+
+Each batch of QRs is replaced in one transaction, so re-running is safe and
+also repairs drift. Days already moved to the scan archive (app/scan_archive.py)
+are kept as they are. Run it right after the qr_scan_daily migration, ideally
+at low traffic: scans flushed for a QR while its batch is being rebuilt may be
+counted twice on PostgreSQL.
+
+``counters`` rebuilds the scan_count/last_scanned_at columns on dynamic_qr from
+the rollup (run it after backfill). The list page reads only those columns.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional
+import argparse
+import asyncio
+
+from sqlalchemy import delete, func, select, update
+
+from app.crud_dynamic_qr import _scan_day, add_rollup_counts, add_unique_sketches, rollup_key, scan_day_expression
+from app.db import AsyncSessionLocal
+from app.hll import HyperLogLog
+from app.models import DynamicQR, QRScan, QRScanDaily, QRScanDailyUniques
+from app.scan_dedup import scan_fingerprint
+from app.scan_archive import archived_through
+
+
+async def _rebuild_unique_sketches(session, qr_ids: list[int], since: Optional[datetime]) -> None:
+    # Same fingerprint the redirect path computes (short code + IP + user agent)
+    query = (
+        select(QRScan.qr_id, QRScan.scanned_at, DynamicQR.short_code, QRScan.ip, QRScan.user_agent)
+        .join(DynamicQR, DynamicQR.id == QRScan.qr_id)
+        .where(QRScan.qr_id.in_(qr_ids))
+    )
+    stale = delete(QRScanDailyUniques).where(QRScanDailyUniques.qr_id.in_(qr_ids))
+    if since is not None:
+        query = query.where(QRScan.scanned_at >= since)
+        stale = stale.where(QRScanDailyUniques.day >= since.date())
+    # Sketches stay a few KB per QR and day whatever the scan count
+    sketches: dict = {}
+    result = await session.stream(query.execution_options(yield_per=5000))
+    async for rows in result.partitions():
+        for scan_qr_id, scanned_at, short_code, ip, user_agent in rows:
+            key = (scan_qr_id, _scan_day(scanned_at))
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = HyperLogLog()
+            sketch.add(scan_fingerprint(short_code, ip or "", user_agent or ""))
+    await session.execute(stale)
+    if sketches:
+        await add_unique_sketches(session, sketches)
+
+
+async def backfill_rollups(batch_size: int = 200, qr_id: Optional[int] = None) -> int:
+    """Rebuild rollup rows from qr_scans; returns the number of scans counted."""
+    counted = 0
+    last_id = 0
+    # Days already moved to the scan archive only survive in the rollup; never rebuild them
+    horizon = await archived_through()
+    async with AsyncSessionLocal() as session:
+        day = scan_day_expression(session)
+        while True:
+            ids_query = select(DynamicQR.id).where(DynamicQR.id > last_id).order_by(DynamicQR.id).limit(batch_size)
+            if qr_id is not None:
+                ids_query = ids_query.where(DynamicQR.id == qr_id)
+            qr_ids = list((await session.execute(ids_query)).scalars())
+            if not qr_ids:
+                break
+            last_id = qr_ids[-1]
+            scans = select(QRScan.qr_id, day, QRScan.device, QRScan.os, QRScan.browser, QRScan.country, func.count())
+            stale = delete(QRScanDaily).where(QRScanDaily.qr_id.in_(qr_ids))
+            since = None
+            if horizon is not None:
+                since = datetime.combine(horizon + timedelta(days=1), time.min, tzinfo=timezone.utc)
+                scans = scans.where(QRScan.scanned_at >= since)
+                stale = stale.where(QRScanDaily.day > horizon)
+            grouped = await session.execute(
+                scans.where(QRScan.qr_id.in_(qr_ids))
+                .group_by(QRScan.qr_id, day, QRScan.device, QRScan.os, QRScan.browser, QRScan.country)
+            )
+            counts: Counter = Counter()
+            for scan_qr_id, scan_day, device, os, browser, country, n in grouped:
+                counts[rollup_key({
+                    "qr_id": scan_qr_id, "scanned_at": scan_day,
+                    "device": device, "os": os, "browser": browser, "country": country,
+                })] += n
+            await session.execute(stale)
+            await add_rollup_counts(session, counts, commit=False)
+            await _rebuild_unique_sketches(session, qr_ids, since)
+            await session.commit()
+            counted += sum(counts.values())
+    return counted
+
+
+async def reconcile_scan_counters(batch_size: int = 1000, qr_id: Optional[int] = None) -> int:
+    """Recompute dynamic_qr.scan_count/last_scanned_at; returns the number of QRs updated."""
+    # The rollup still counts archived scans; raw rows only know the latest scan
+    total = (
+        select(func.coalesce(func.sum(QRScanDaily.count), 0))
+        .where(QRScanDaily.qr_id == DynamicQR.id)
+        .scalar_subquery()
+    )
+    latest = select(func.max(QRScan.scanned_at)).where(QRScan.qr_id == DynamicQR.id).scalar_subquery()
+    updated = 0
+    last_id = 0
+    async with AsyncSessionLocal() as session:
+        while True:
+            ids_query = select(DynamicQR.id).where(DynamicQR.id > last_id).order_by(DynamicQR.id).limit(batch_size)
+            if qr_id is not None:
+                ids_query = ids_query.where(DynamicQR.id == qr_id)
+            qr_ids = list((await session.execute(ids_query)).scalars())
+            if not qr_ids:
+                break
+            last_id = qr_ids[-1]
+            await session.execute(
+                update(DynamicQR)
+                .where(DynamicQR.id.in_(qr_ids))
+                .values(scan_count=total, last_scanned_at=func.coalesce(latest, DynamicQR.last_scanned_at))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            updated += len(qr_ids)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily scan rollup table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="Recompute qr_scan_daily from qr_scans")
+    backfill.add_argument("--batch-size", type=int, default=200, help="QRs rebuilt per transaction")
+    backfill.add_argument("--qr-id", type=int, default=None, help="Only rebuild this QR")
+    counters = commands.add_parser("counters", help="Recompute dynamic_qr.scan_count and last_scanned_at")
+    counters.add_argument("--batch-size", type=int, default=1000, help="QRs updated per transaction")
+    counters.add_argument("--qr-id", type=int, default=None, help="Only reconcile this QR")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        print(f"Counted {asyncio.run(backfill_rollups(args.batch_size, args.qr_id))} scans into qr_scan_daily.")
+    else:
+        print(f"Reconciled scan counters for {asyncio.run(reconcile_scan_counters(args.batch_size, args.qr_id))} QRs.")
+
+
+if __name__ == "__main__":
+    main()
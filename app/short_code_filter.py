@@ -0,0 +1,200 @@
+"""
+Bloom-filter negative cache for short codes: a miss means the code did not
+exist when this process last synced with the database, at most
+``refresh_interval`` seconds ago, so /r/{short_code} can answer 404 without
+a database lookup.
+"""
+from time import monotonic
+from typing import Iterable, Optional
+import asyncio
+import logging
+import math
+import os
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import AsyncSessionLocal
+from app.models import DynamicQR
+
+logger = logging.getLogger(__name__)
+
+_MIX = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # The process-salted str hash is fine: the filter never leaves this process
+        h1 = hash(item) & _MASK64
+        h2 = ((h1 * _MIX) & _MASK64) >> 17 | 1
+        m = self.num_bits
+        return ((h1 + i * h2) % m for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        bits = self._bits
+        for pos in self._positions(item):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class ShortCodeFilter:
+    """
+    Bloom filter of every existing short code, rebuilt from the database at
+    startup and updated as codes are created.
+
+    Codes created by other worker processes are picked up by an incremental
+    refresh that runs when a lookup would otherwise be a miss and the last
+    sync is older than ``refresh_interval``; a miss is trusted otherwise, so
+    staleness is bounded by that interval. Only database scans advance
+    ``max_id``, and each refresh re-reads the last ``lookback`` ids below it:
+    concurrent inserts can commit out of id order, and a row that became
+    visible after a higher id was seen would otherwise be skipped for good.
+    """
+
+    def __init__(
+        self,
+        error_rate: float = 0.001,
+        refresh_interval: float = 1.0,
+        min_capacity: int = 100000,
+        lookback: int = 1000,
+    ):
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.min_capacity = min_capacity
+        self.lookback = lookback
+        self._bloom: Optional[BloomFilter] = None
+        self._pending: Optional[list[str]] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._max_id = 0
+        self._last_refresh = 0.0
+        self.misses = 0
+        self.maybe_hits = 0
+        self.false_positives = 0
+        self.refreshes = 0
+        self.rebuilds = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._bloom is not None
+
+    async def rebuild(self) -> None:
+        """Build a fresh filter from the database, sized for the current table, and swap it in."""
+        # Codes created while the snapshot is read are replayed into the new filter
+        self._pending = []
+        try:
+            async with AsyncSessionLocal() as session:
+                total = (await session.execute(select(func.count(DynamicQR.id)))).scalar_one()
+                bloom = BloomFilter(max(self.min_capacity, total * 2), self.error_rate)
+                max_id = 0
+                result = await session.stream(
+                    select(DynamicQR.id, DynamicQR.short_code).execution_options(yield_per=10000)
+                )
+                async for qr_id, short_code in result:
+                    bloom.add(short_code)
+                    max_id = max(max_id, qr_id)
+            for short_code in self._pending:
+                bloom.add(short_code)
+        finally:
+            self._pending = None
+        self._bloom = bloom
+        self._max_id = max_id
+        self._last_refresh = monotonic()
+        self.rebuilds += 1
+
+    async def refresh(self, session: AsyncSession) -> None:
+        result = await session.execute(
+            select(DynamicQR.id, DynamicQR.short_code)
+            .where(DynamicQR.id > self._max_id - self.lookback)
+            .order_by(DynamicQR.id)
+        )
+        bloom = self._bloom
+        for qr_id, short_code in result:
+            # The lookback re-reads known rows; re-adding them would only inflate the count
+            if bloom is None or short_code not in bloom:
+                self.add(short_code)
+            self._max_id = max(self._max_id, qr_id)
+        self._last_refresh = monotonic()
+        self.refreshes += 1
+        if bloom is not None and bloom.count > bloom.capacity:
+            # Past its sizing the false-positive rate climbs; resize from the database
+            self.schedule_rebuild()
+
+    def schedule_rebuild(self) -> None:
+        """Rebuild in a background task; until the first build finishes every code counts as a maybe."""
+        if self._rebuild_task is None:
+            self._rebuild_task = asyncio.get_running_loop().create_task(self._background_rebuild())
+
+    async def _background_rebuild(self) -> None:
+        try:
+            await self.rebuild()
+        except Exception:
+            logger.exception("Short code filter rebuild failed")
+        finally:
+            self._rebuild_task = None
+
+    async def stop(self) -> None:
+        task = self._rebuild_task
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def add(self, short_code: str) -> None:
+        if self._bloom is not None:
+            self._bloom.add(short_code)
+        if self._pending is not None:
+            self._pending.append(short_code)
+
+    async def might_exist(self, session: AsyncSession, short_code: str) -> bool:
+        bloom = self._bloom
+        if bloom is None:
+            return True
+        if short_code in bloom:
+            self.maybe_hits += 1
+            return True
+        if monotonic() - self._last_refresh >= self.refresh_interval:
+            await self.refresh(session)
+            if short_code in self._bloom:
+                self.maybe_hits += 1
+                return True
+        self.misses += 1
+        return False
+
+    def stats(self) -> dict:
+        bloom = self._bloom
+        return {
+            "ready": bloom is not None,
+            "codes": bloom.count if bloom is not None else 0,
+            "capacity": bloom.capacity if bloom is not None else 0,
+            "bits": bloom.num_bits if bloom is not None else 0,
+            "hashes": bloom.num_hashes if bloom is not None else 0,
+            "misses": self.misses,
+            "maybe_hits": self.maybe_hits,
+            "false_positives": self.false_positives,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+        }
+
+
+short_code_filter = ShortCodeFilter(
+    refresh_interval=float(os.getenv("SHORT_CODE_FILTER_REFRESH_SECONDS", "1.0")),
+    lookback=int(os.getenv("SHORT_CODE_FILTER_LOOKBACK", "1000")),
+)
@@ -0,0 +1,141 @@
+"""
+Collision-free short-code allocation.
+
+Codes are derived from a database sequence instead of being drawn at random
+and probed for: each sequence value is passed through a keyed permutation of
+the 48-bit space and encoded as 8 URL-safe characters, the same alphabet and
+length as the random codes issued before. Distinct sequence values always
+map to distinct codes, so no read-before-write is needed.
+
+Workers reserve blocks of sequence values with a single atomic
+``UPDATE ... RETURNING`` and hand codes out of the block locally. Codes can
+still clash with rows created by the old random generator (or after
+SHORT_CODE_SECRET changes); inserts catch the unique-constraint error and
+take the next code.
+
+The permutation is only as private as its key: anyone who knows it can
+invert it and list every code in allocation order. SHORT_CODE_SECRET is
+therefore required, and the app refuses to start without it.
+"""
+from base64 import urlsafe_b64encode
+from hashlib import blake2b
+from typing import Optional
+import asyncio
+import os
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from app.db import AsyncSessionLocal
+from app.models import ShortCodeSequence
+
+_HALF_BITS = 24
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+SEQUENCE_SPACE = 1 << (2 * _HALF_BITS)
+
+
+class ShortCodePermutation:
+    """Balanced Feistel network over 48-bit integers, keyed with a secret."""
+
+    def __init__(self, secret: bytes):
+        self._keys = [blake2b(secret, digest_size=16, person=b"qr-short-%d" % i).digest() for i in range(_ROUNDS)]
+
+    def _round(self, value: int, key: bytes) -> int:
+        digest = blake2b(value.to_bytes(3, "big"), digest_size=3, key=key).digest()
+        return int.from_bytes(digest, "big")
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < SEQUENCE_SPACE:
+            raise ValueError("sequence value out of range")
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for key in self._keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << _HALF_BITS) | right
+
+    def encode(self, value: int) -> str:
+        return urlsafe_b64encode(self.permute(value).to_bytes(6, "big")).decode("ascii")
+
+
+class ShortCodeAllocator:
+    """Hands out codes from sequence blocks reserved in the short_code_sequence table."""
+
+    def __init__(self, permutation: Optional[ShortCodePermutation], block_size: int = 100):
+        self.permutation = permutation
+        self.block_size = block_size
+        self._lock = asyncio.Lock()
+        self._next = 0
+        self._end = 0
+        self.blocks_reserved = 0
+        self.allocated = 0
+        self.collisions = 0
+
+    async def _reserve(self, count: int) -> tuple[int, int]:
+        # Own session and transaction: the reservation must commit even if the caller's insert fails
+        async with AsyncSessionLocal() as session:
+            while True:
+                result = await session.execute(
+                    update(ShortCodeSequence)
+                    .where(ShortCodeSequence.id == 1)
+                    .values(next_value=ShortCodeSequence.next_value + count)
+                    .returning(ShortCodeSequence.next_value)
+                )
+                end = result.scalar_one_or_none()
+                if end is not None:
+                    await session.commit()
+                    break
+                # Table created without its seed row (e.g. by create_all); first worker in wins
+                session.add(ShortCodeSequence(id=1, next_value=count))
+                try:
+                    await session.commit()
+                    end = count
+                    break
+                except IntegrityError:
+                    await session.rollback()
+        if end > SEQUENCE_SPACE:
+            raise RuntimeError("short code sequence exhausted")
+        self.blocks_reserved += 1
+        return end - count, end
+
+    def check_configured(self) -> None:
+        if self.permutation is None:
+            raise RuntimeError("SHORT_CODE_SECRET environment variable is not set")
+
+    async def allocate_many(self, count: int) -> list[str]:
+        """Allocate ``count`` codes, topping up from a fresh block when the local one runs out."""
+        self.check_configured()
+        values: list[int] = []
+        async with self._lock:
+            while len(values) < count:
+                if self._next >= self._end:
+                    self._next, self._end = await self._reserve(max(self.block_size, count - len(values)))
+                take = min(self._end - self._next, count - len(values))
+                values.extend(range(self._next, self._next + take))
+                self._next += take
+        self.allocated += count
+        encode = self.permutation.encode
+        return [encode(value) for value in values]
+
+    async def allocate(self) -> str:
+        return (await self.allocate_many(1))[0]
+
+    def stats(self) -> dict:
+        return {
+            "block_size": self.block_size,
+            "blocks_reserved": self.blocks_reserved,
+            "remaining_in_block": self._end - self._next,
+            "allocated": self.allocated,
+            "collisions": self.collisions,
+        }
+
+
+def _permutation() -> Optional[ShortCodePermutation]:
+    # No built-in fallback: a public key would make every code enumerable
+    secret = os.getenv("SHORT_CODE_SECRET")
+    return ShortCodePermutation(secret.encode("utf-8")) if secret else None
+
+
+short_code_allocator = ShortCodeAllocator(
+    _permutation(),
+    block_size=int(os.getenv("SHORT_CODE_BLOCK_SIZE", "100")),
+)
@@ -0,0 +1,61 @@
+"""
+In-process cache of the per-QR scan stats payload (the charts' JSON).
+
+Entries are stamped with the QR's scan counters (scan_count, last_scanned_at),
+which every scan write bumps in the same transaction as the rollup. A view
+whose QR has the same stamp reuses the serialised payload instead of
+aggregating again. The TTL bounds how long a payload survives changes that do
+not move the counters, such as a rollup backfill repairing drift.
+"""
+from hashlib import blake2b
+from typing import Optional
+import os
+
+from app.lru import LRUCache
+
+
+class CachedStats:
+    __slots__ = ("version", "stats", "body", "etag")
+
+    def __init__(self, version: tuple, stats: dict, body: bytes):
+        self.version = version
+        self.stats = stats
+        self.body = body
+        # Strong validator: derived from the exact bytes served
+        self.etag = '"' + blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ScanStatsCache:
+    """Bounded LRU of (qr_id, from, to) -> CachedStats, valid while the version stamp matches."""
+
+    def __init__(self, max_size: int = 2000, ttl_seconds: float = 300.0):
+        self._cache: LRUCache[CachedStats] = LRUCache(max_size, ttl_seconds)
+
+    def get(self, key: tuple, version: tuple) -> Optional[CachedStats]:
+        # A moved stamp means scans were written since; the entry counts as stale
+        return self._cache.get(key, lambda entry: entry.version == version)
+
+    def put(self, key: tuple, version: tuple, stats: dict, body: bytes) -> CachedStats:
+        return self._cache.put(key, CachedStats(version, stats, body))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison: a W/ prefix on either side is ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+scan_stats_cache = ScanStatsCache(
+    max_size=int(os.getenv("SCAN_STATS_CACHE_SIZE", "2000")),
+    ttl_seconds=float(os.getenv("SCAN_STATS_CACHE_TTL_SECONDS", "300")),
+)
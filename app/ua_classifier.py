@@ -0,0 +1,85 @@
+"""
+Memoized user-agent classification into (device, os, browser) for scan enrichment.
+"""
+from typing import Optional
+import os
+
+from app.lru import LRUCache
+
+
+def _classify(user_agent: str) -> tuple[str, Optional[str], Optional[str]]:
+    # Precedence must match the rules scans were historically classified with.
+    # Short-circuit substring searches beat a combined single-pass regex here
+    # (see benchmarks/bench_ua_classifier.py), so the big win is the memo.
+    ua = user_agent.lower()
+    # Device
+    if "mobile" in ua or "iphone" in ua or "android" in ua or "ipod" in ua:
+        device = "mobile"
+    elif "ipad" in ua or "tablet" in ua:
+        device = "tablet"
+    else:
+        device = "desktop"
+    # OS
+    if "android" in ua:
+        os = "android"
+    elif "iphone" in ua or "ipad" in ua or "ipod" in ua or "ios" in ua:
+        os = "ios"
+    elif "windows" in ua:
+        os = "windows"
+    elif "mac os x" in ua or "macintosh" in ua:
+        os = "macos"
+    elif "cros" in ua:
+        os = "chromeos"
+    elif "linux" in ua:
+        os = "linux"
+    else:
+        os = None
+    # Browser (order matters)
+    if "yabrowser" in ua or "yandex" in ua:
+        browser = "yandex"
+    elif "opr/" in ua or "opera" in ua:
+        browser = "opera"
+    elif "edg/" in ua or "edge" in ua:
+        browser = "edge"
+    elif "samsungbrowser" in ua:
+        browser = "samsung"
+    elif "firefox" in ua or "fxios" in ua:
+        browser = "firefox"
+    elif "crios" in ua:
+        browser = "chrome"
+    elif "chrome" in ua and "chromium" not in ua and "edg" not in ua and "opr" not in ua:
+        browser = "chrome"
+    elif "safari" in ua:
+        browser = "safari"
+    elif "brave" in ua:
+        browser = "brave"
+    else:
+        browser = None
+    return device, os, browser
+
+
+class UserAgentClassifier:
+    """
+    LRU memo in front of the classifier. Keys are the UA's hash rather
+    than the string itself, so oversized UA headers don't inflate the cache.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self._memo: LRUCache[tuple[str, Optional[str], Optional[str]]] = LRUCache(max_size)
+
+    def classify(self, user_agent: str) -> tuple[str, Optional[str], Optional[str]]:
+        key = hash(user_agent)
+        result = self._memo.get(key)
+        if result is None:
+            result = self._memo.put(key, _classify(user_agent))
+        return result
+
+    def clear(self) -> None:
+        self._memo.clear()
+
+    def stats(self) -> dict:
+        return self._memo.stats()
+
+
+ua_classifier = UserAgentClassifier(max_size=int(os.getenv("UA_CLASSIFIER_CACHE_SIZE", "4096")))
+classify_user_agent = ua_classifier.classify
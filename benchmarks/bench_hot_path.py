@@ -0,0 +1,87 @@
+"""
+Microbenchmarks for the pure functions on the /r/{short_code} hot path:
+client-IP extraction, scan de-duplication, short-code encoding and the
+markdown renderer used by the blog.
+
+    python benchmarks/bench_hot_path.py [--rounds 200]
+"""
+from pathlib import Path
+import argparse
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.harness import DATA_DIR, load_lines, load_ndjson, ns_per_call, print_results, result  # noqa: E402
+from starlette.datastructures import Headers  # noqa: E402
+from app.endpoints_dynamic_qr import (  # noqa: E402
+    _client_ip,
+    _detect_device_os_browser,
+    _should_record_scan,
+)
+from app.scan_dedup import scan_fingerprint  # noqa: E402
+from app.short_codes import ShortCodePermutation  # noqa: E402
+from app.utils.markdown import convert_markdown_to_html  # noqa: E402
+
+
+def bench_client_ip(rounds: int) -> list[dict]:
+    variants = [Headers(headers=case) for case in load_ndjson("forwarded_headers.ndjson")]
+    return [result(
+        "client_ip/forwarded_variants",
+        ns_per_call(lambda headers: _client_ip(headers, "127.0.0.1"), variants, rounds),
+        rounds * len(variants),
+    )]
+
+
+def bench_dedup(rounds: int) -> list[dict]:
+    user_agents = load_lines("user_agents.txt")
+    clients = [(f"code{i % 50:04d}", f"198.51.{i // 256 % 256}.{i % 256}", user_agents[i % len(user_agents)]) for i in range(2000)]
+    fingerprints = [scan_fingerprint(*client) for client in clients]
+    # First pass records everything; repeat passes inside the TTL are all duplicates
+    first_pass = ns_per_call(_should_record_scan, fingerprints, 1, warmup=False)
+    repeats = ns_per_call(_should_record_scan, fingerprints, rounds, warmup=False)
+    return [
+        result("scan_fingerprint", ns_per_call(lambda c: scan_fingerprint(*c), clients, rounds), rounds * len(clients)),
+        result("should_record_scan/new", first_pass, len(fingerprints)),
+        result("should_record_scan/duplicate", repeats, rounds * len(fingerprints)),
+    ]
+
+
+def bench_detect(rounds: int) -> list[dict]:
+    user_agents = load_lines("user_agents.txt")
+    return [result(
+        "detect_device_os_browser",
+        ns_per_call(_detect_device_os_browser, user_agents, rounds),
+        rounds * len(user_agents),
+    )]
+
+
+def bench_short_code(rounds: int) -> list[dict]:
+    # Encoding only: block reservation is one UPDATE per SHORT_CODE_BLOCK_SIZE codes
+    values = list(range(1000))
+    # The key does not affect the cost, and benchmarks should not need SHORT_CODE_SECRET
+    encode = ShortCodePermutation(b"benchmark").encode
+    return [result("short_code_encode", ns_per_call(encode, values, rounds), rounds * len(values))]
+
+
+def bench_markdown(rounds: int) -> list[dict]:
+    posts = [(DATA_DIR / "sample_post.md").read_text(encoding="utf-8")]
+    passes = max(1, rounds // 20)
+    return [result("convert_markdown_to_html/sample_post", ns_per_call(convert_markdown_to_html, posts, passes), passes)]
+
+
+def run(rounds: int = 200) -> list[dict]:
+    results: list[dict] = []
+    for bench in (bench_client_ip, bench_detect, bench_dedup, bench_short_code, bench_markdown):
+        results.extend(bench(rounds))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark redirect hot-path helpers.")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    print_results(run(args.rounds))
+
+
+if __name__ == "__main__":
+    main()
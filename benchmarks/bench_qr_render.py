@@ -0,0 +1,235 @@
+"""
+QR rendering cost by stage and backend, for picking how images are served.
+
+    python benchmarks/bench_qr_render.py [--rounds 3] [--payloads short_link,vcard_full]
+                                         [--ec L,M,Q,H] [--sizes 200,300] [--backends pil_png,numpy_png]
+
+Stages, each timed on its own:
+
+- encode: segmenting the data, Reed-Solomon blocks and module placement with
+  a fixed mask (the version is found up front, as ``make(fit=True)`` would)
+- mask: ``best_mask_pattern()``, i.e. placing all eight masks and scoring
+  each with the penalty rules
+- raster: turning the encoded code into image bytes, per backend:
+  ``pil_png`` (qrcode's PIL factory, as the server rendered before the NumPy
+  rasteriser), ``svg_path`` (qrcode's SvgPathImage), ``numpy_png`` and
+  ``merged_svg`` (app/qr_render.py)
+
+Payloads run from a short /r/ link to a 2 KB vCard (benchmarks/data/vcard.vcf)
+at every EC level and every size the UI offers; combinations that do not fit
+in a QR code are listed as such. Peak memory is the tracemalloc high-water
+mark of one raster call: NumPy buffers are traced, but PIL allocates pixel
+memory in C, so the PIL figure undercounts.
+"""
+from pathlib import Path
+from time import perf_counter_ns
+from xml.etree import ElementTree as ET
+import argparse
+import io
+import sys
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.harness import DATA_DIR, print_results, result  # noqa: E402
+
+from PIL import Image  # noqa: E402
+import numpy as np  # noqa: E402
+import qrcode  # noqa: E402
+from qrcode.image.svg import SvgPathImage  # noqa: E402
+
+from app.qr_render import EC_LEVELS, encode_matrix, parse_spec, rasterize_png, svg_document  # noqa: E402
+
+BORDER = 4
+UI_SIZES = (200, 300, 500, 1000, 1500, 2000)
+BACKENDS = ("pil_png", "svg_path", "numpy_png", "merged_svg")
+
+
+def _vcard(lines: int = 0) -> str:
+    card = (DATA_DIR / "vcard.vcf").read_text(encoding="utf-8").splitlines()
+    if lines:
+        card = card[:lines] + ["END:VCARD"]
+    return "\r\n".join(card)
+
+
+PAYLOADS = {
+    "short_link": "https://qrgenerator.world/r/AbCd1234",
+    "utm_url": (
+        "https://shop.example.com/collections/spring-2025/linen-shirt?variant=4471&utm_source=flyer"
+        "&utm_medium=qr&utm_campaign=spring-launch-samarkand&utm_content=window-poster-a3"
+    ),
+    "vcard_basic": _vcard(11),
+    "vcard_full": _vcard(),
+}
+
+
+def _code(payload: str, ec: str, version: int, mask_pattern=None) -> qrcode.QRCode:
+    qr = qrcode.QRCode(version=version, error_correction=EC_LEVELS[ec], border=BORDER, mask_pattern=mask_pattern)
+    qr.add_data(payload)
+    return qr
+
+
+def _fit(payload: str, ec: str):
+    """Smallest version holding the payload, or None if it does not fit at this EC level."""
+    try:
+        return _code(payload, ec, None).best_fit()
+    except (qrcode.exceptions.DataOverflowError, ValueError):
+        # Past version 40 the library trips its own version check instead of raising DataOverflowError
+        return None
+
+
+def _encode(payload: str, ec: str, version: int, mask: int) -> qrcode.QRCode:
+    qr = _code(payload, ec, version, mask)
+    qr.make(fit=False)
+    return qr
+
+
+def _pil_png(qr: qrcode.QRCode, size: int, spec) -> bytes:
+    qr.box_size = max(1, size // (qr.modules_count + 2 * BORDER))
+    image = qr.make_image(fill_color=spec.fg, back_color=spec.bg).get_image()
+    if image.size[0] < size:
+        canvas = Image.new(image.mode, (size, size), spec.bg)
+        offset = (size - image.size[0]) // 2
+        canvas.paste(image, (offset, offset))
+        image = canvas
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def _svg_path(qr: qrcode.QRCode, size: int, spec) -> bytes:
+    qr.box_size = 10
+    svg = qr.make_image(image_factory=SvgPathImage).get_image()
+    svg.set("width", str(size))
+    svg.set("height", str(size))
+    return ET.tostring(svg, encoding="UTF-8")
+
+
+def _raster(backend: str, qr: qrcode.QRCode, matrix: np.ndarray, size: int, spec):
+    if backend == "pil_png":
+        return lambda: _pil_png(qr, size, spec)
+    if backend == "svg_path":
+        return lambda: _svg_path(qr, size, spec)
+    if backend == "numpy_png":
+        return lambda: rasterize_png(matrix, spec)
+    return lambda: svg_document(matrix, spec)
+
+
+def _mean_ns(fn, rounds: int) -> float:
+    fn()
+    start = perf_counter_ns()
+    for _ in range(rounds):
+        fn()
+    return (perf_counter_ns() - start) / rounds
+
+
+def _peak_bytes(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(name: str, ec: str, sizes, backends, rounds: int) -> list[dict]:
+    """Rows for one payload at one EC level: shared encode/mask timings, one row per size and backend."""
+    payload = PAYLOADS[name]
+    base = {"payload": name, "payload_bytes": len(payload.encode("utf-8")), "ec": ec}
+    version = _fit(payload, ec)
+    if version is None:
+        return [{**base, "version": None}]
+    # The mask make() would pick, so the encode stage places the real one
+    mask = _code(payload, ec, version).best_mask_pattern()
+    qr = _encode(payload, ec, version, mask)
+    matrix = encode_matrix(payload, ec, version)
+    if not np.array_equal(matrix, np.array(qr.modules, dtype=bool)):
+        raise AssertionError(f"{name}/{ec}: cached matrix differs from the library's")
+    encode_ns = _mean_ns(lambda: _encode(payload, ec, version, mask), rounds)
+    mask_ns = _mean_ns(lambda: _code(payload, ec, version).best_mask_pattern(), rounds)
+
+    rows = []
+    for size in sizes:
+        spec = parse_spec(payload, "png", size, border=BORDER)
+        for backend in backends:
+            raster = _raster(backend, qr, matrix, size, spec)
+            rows.append({
+                **base,
+                "version": version,
+                "size": size,
+                "backend": backend,
+                "encode_ns": encode_ns,
+                "mask_ns": mask_ns,
+                "raster_ns": _mean_ns(raster, rounds),
+                "peak_bytes": _peak_bytes(raster),
+                "output_bytes": len(raster()),
+            })
+    return rows
+
+
+def run(rounds: int = 3, payloads=tuple(PAYLOADS), ecs=("L", "H"), sizes=(300,), backends=BACKENDS) -> list[dict]:
+    """Suite entry for benchmarks/run.py: raster time per row, with the other stages as extra fields."""
+    results = []
+    for name in payloads:
+        for ec in ecs:
+            for row in measure(name, ec, sizes, backends, rounds):
+                if row["version"] is None:
+                    continue
+                results.append(result(
+                    f"qr_render/{name}/{ec}/{row['size']}/{row['backend']}",
+                    row["raster_ns"],
+                    rounds,
+                    version=row["version"],
+                    encode_ns=round(row["encode_ns"], 1),
+                    mask_ns=round(row["mask_ns"], 1),
+                    peak_bytes=row["peak_bytes"],
+                    output_bytes=row["output_bytes"],
+                ))
+    return results
+
+
+def _choices(value: str, allowed, cast=str) -> list:
+    picked = [cast(item.strip()) for item in value.split(",") if item.strip()]
+    unknown = [item for item in picked if item not in allowed]
+    if unknown:
+        raise SystemExit(f"unknown value(s) {unknown}; choose from {list(allowed)}")
+    return picked
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark QR encode, mask selection and rasterisation per backend.")
+    parser.add_argument("--rounds", type=int, default=3, help="Calls per timing")
+    parser.add_argument("--payloads", default=",".join(PAYLOADS))
+    parser.add_argument("--ec", default=",".join(EC_LEVELS))
+    parser.add_argument("--sizes", default=",".join(map(str, UI_SIZES)))
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--suite", action="store_true", help="Print run.py-style results instead of the table")
+    args = parser.parse_args()
+    payloads = _choices(args.payloads, PAYLOADS)
+    ecs = _choices(args.ec.upper(), EC_LEVELS)
+    sizes = _choices(args.sizes, UI_SIZES, int)
+    backends = _choices(args.backends, BACKENDS)
+    if args.suite:
+        print_results(run(args.rounds, payloads, ecs, sizes, backends))
+        return
+
+    print(f"border {BORDER}, {args.rounds} rounds; times in ms, peak memory in KiB, output in bytes")
+    print(f"{'payload':<12} {'bytes':>5} {'ec':>2} {'ver':>3} {'size':>5} {'backend':<10} | "
+          f"{'encode':>7} {'mask':>7} {'raster':>7} {'total':>7} | {'peak':>7} {'output':>7}")
+    for name in payloads:
+        for ec in ecs:
+            for row in measure(name, ec, sizes, backends, args.rounds):
+                if row["version"] is None:
+                    print(f"{name:<12} {row['payload_bytes']:>5} {ec:>2}   - does not fit in a QR code")
+                    continue
+                total = row["encode_ns"] + row["mask_ns"] + row["raster_ns"]
+                print(
+                    f"{name:<12} {row['payload_bytes']:>5} {ec:>2} {row['version']:>3} {row['size']:>5} "
+                    f"{row['backend']:<10} | {row['encode_ns'] / 1e6:>7.2f} {row['mask_ns'] / 1e6:>7.2f} "
+                    f"{row['raster_ns'] / 1e6:>7.2f} {total / 1e6:>7.2f} | {row['peak_bytes'] / 1024:>7.1f} "
+                    f"{row['output_bytes']:>7}"
+                )
+
+
+if __name__ == "__main__":
+    main()
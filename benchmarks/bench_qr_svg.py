@@ -0,0 +1,135 @@
+"""
+SVG output size and render time: the qrcode library's SVG factories against
+the run-merged path writer in app/qr_render.py, for QR versions 1-40 at EC
+level H (what dynamic QR links use).
+
+    python benchmarks/bench_qr_svg.py [--rounds 5] [--versions 1-40]
+
+Each version is forced with a short-link payload (cut down to fit versions
+too small for it), so the module count is the variable. Encoding happens once
+up front; the timings cover turning the module matrix into SVG bytes. Every
+merged path is decoded back into a matrix and checked against the library's
+before anything is timed.
+"""
+from pathlib import Path
+from time import perf_counter_ns
+import argparse
+import re
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.harness import print_results, result  # noqa: E402
+
+import numpy as np  # noqa: E402
+import qrcode  # noqa: E402
+from qrcode.image.svg import SvgImage, SvgPathImage  # noqa: E402
+
+from app.qr_render import encode_matrix, parse_spec, svg_document, svg_path  # noqa: E402
+
+PAYLOAD = "https://qrgenerator.world/r/AbCd1234"
+BORDER = 4
+_RUN = re.compile(r"([Mm])(-?\d+) (-?\d+)h(\d+)v1h-\d+z")
+
+
+def _stock_qr(version: int, payload: str) -> qrcode.QRCode:
+    qr = qrcode.QRCode(version=version, error_correction=qrcode.constants.ERROR_CORRECT_H, border=BORDER)
+    qr.add_data(payload)
+    qr.make(fit=False)
+    return qr
+
+
+def _payload(version: int) -> str:
+    for length in range(len(PAYLOAD), 0, -1):
+        try:
+            _stock_qr(version, PAYLOAD[:length])
+        except qrcode.exceptions.DataOverflowError:
+            continue
+        return PAYLOAD[:length]
+    raise ValueError(f"nothing fits in version {version}")
+
+
+def _stock_svg(qr: qrcode.QRCode, factory) -> bytes:
+    return qr.make_image(image_factory=factory).to_string(encoding="UTF-8")
+
+
+def _decode_path(d: str, shape: tuple) -> np.ndarray:
+    grid = np.zeros(shape, dtype=bool)
+    x = y = 0
+    for command, dx, dy, width in _RUN.findall(d):
+        x, y = (int(dx), int(dy)) if command == "M" else (x + int(dx), y + int(dy))
+        grid[y - BORDER, x - BORDER:x - BORDER + int(width)] = True
+    return grid
+
+
+def _mean_ns(fn, rounds: int) -> float:
+    fn()
+    start = perf_counter_ns()
+    for _ in range(rounds):
+        fn()
+    return (perf_counter_ns() - start) / rounds
+
+
+def measure(version: int, rounds: int) -> dict:
+    payload = _payload(version)
+    qr = _stock_qr(version, payload)
+    matrix = encode_matrix(payload, "H", version)
+    if not np.array_equal(matrix, np.array(qr.modules, dtype=bool)):
+        raise AssertionError(f"version {version}: cached matrix differs from the library's")
+    if not np.array_equal(_decode_path(svg_path(matrix, BORDER), matrix.shape), matrix):
+        raise AssertionError(f"version {version}: merged path does not reproduce the matrix")
+    plain = parse_spec(payload, "svg", 300, border=BORDER)
+    packed = parse_spec(payload, "svg", 300, border=BORDER, compress=True)
+    return {
+        "version": version,
+        "modules": matrix.shape[0],
+        "rect_bytes": len(_stock_svg(qr, SvgImage)),
+        "path_bytes": len(_stock_svg(qr, SvgPathImage)),
+        "merged_bytes": len(svg_document(matrix, plain)),
+        "merged_gz_bytes": len(svg_document(matrix, packed)),
+        "rect_ns": _mean_ns(lambda: _stock_svg(qr, SvgImage), rounds),
+        "path_ns": _mean_ns(lambda: _stock_svg(qr, SvgPathImage), rounds),
+        "merged_ns": _mean_ns(lambda: svg_document(matrix, plain), rounds),
+        "merged_gz_ns": _mean_ns(lambda: svg_document(matrix, packed), rounds),
+    }
+
+
+def _versions(spec: str) -> list[int]:
+    first, _, last = spec.partition("-")
+    return list(range(int(first), int(last or first) + 1))
+
+
+def run(rounds: int = 5, versions=(1, 10, 25, 40)) -> list[dict]:
+    """Suite entry for benchmarks/run.py: render time per version, with sizes as extra fields."""
+    results = []
+    for version in versions:
+        row = measure(version, rounds)
+        sizes = {key: row[key] for key in ("rect_bytes", "path_bytes", "merged_bytes", "merged_gz_bytes")}
+        for variant in ("rect", "path", "merged", "merged_gz"):
+            results.append(result(f"qr_svg/v{version}/{variant}", row[f"{variant}_ns"], rounds, **sizes))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark SVG QR output against the stock qrcode factories.")
+    parser.add_argument("--rounds", type=int, default=5, help="Renders per measurement")
+    parser.add_argument("--versions", default="1-40", help="QR version or range, e.g. 1-40 or 25")
+    parser.add_argument("--suite", action="store_true", help="Print run.py-style results instead of the table")
+    args = parser.parse_args()
+    if args.suite:
+        print_results(run(args.rounds, _versions(args.versions)))
+        return
+    print(f"EC level H, border {BORDER}, {args.rounds} rounds; sizes in bytes, times in ms")
+    print(f"{'ver':>3} {'mods':>4} | {'rect':>8} {'path':>8} {'merged':>7} {'gz':>6} | "
+          f"{'rect':>7} {'path':>7} {'merged':>7} {'gz':>6}")
+    for version in _versions(args.versions):
+        row = measure(version, args.rounds)
+        print(
+            f"{row['version']:>3} {row['modules']:>4} | {row['rect_bytes']:>8} {row['path_bytes']:>8} "
+            f"{row['merged_bytes']:>7} {row['merged_gz_bytes']:>6} | {row['rect_ns'] / 1e6:>7.2f} "
+            f"{row['path_ns'] / 1e6:>7.2f} {row['merged_ns'] / 1e6:>7.2f} {row['merged_gz_ns'] / 1e6:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
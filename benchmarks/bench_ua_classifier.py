@@ -0,0 +1,130 @@
+"""
+Microbenchmark for user-agent classification on the redirect path.
+
+Compares the original any()-based classifier, a precompiled single-pass regex
+matcher, and app/ua_classifier.py both uncached and memoized (cold: every UA
+is a cache miss; warm: every UA is already memoized). All variants are checked
+to agree on the corpus before timing.
+
+    python benchmarks/bench_ua_classifier.py [--rounds 200]
+"""
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Optional
+import argparse
+import re
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.harness import load_lines, ns_per_call, print_results, result  # noqa: E402
+from app.ua_classifier import UserAgentClassifier, _classify  # noqa: E402
+
+
+def load_user_agents() -> list[str]:
+    return load_lines("user_agents.txt")
+
+
+def legacy_detect(user_agent: str) -> tuple[str, Optional[str], Optional[str]]:
+    """The classifier as it shipped in endpoints_dynamic_qr.py before memoization."""
+    ua = user_agent.lower()
+    device = "mobile" if any(x in ua for x in ["mobile", "iphone", "android", "ipod"]) else ("tablet" if any(x in ua for x in ["ipad", "tablet"]) else "desktop")
+    if "android" in ua:
+        os = "android"
+    elif any(x in ua for x in ["iphone", "ipad", "ipod", "ios"]):
+        os = "ios"
+    elif "windows" in ua:
+        os = "windows"
+    elif "mac os x" in ua or "macintosh" in ua:
+        os = "macos"
+    elif "cros" in ua:
+        os = "chromeos"
+    elif "linux" in ua:
+        os = "linux"
+    else:
+        os = None
+    if "yabrowser" in ua or "yandex" in ua:
+        browser = "yandex"
+    elif "opr/" in ua or "opera" in ua:
+        browser = "opera"
+    elif "edg/" in ua or "edge" in ua:
+        browser = "edge"
+    elif "samsungbrowser" in ua:
+        browser = "samsung"
+    elif "firefox" in ua or "fxios" in ua:
+        browser = "firefox"
+    elif "crios" in ua:
+        browser = "chrome"
+    elif "chrome" in ua and "chromium" not in ua and "edg" not in ua and "opr" not in ua and "yabrowser" not in ua:
+        browser = "chrome"
+    elif "safari" in ua:
+        browser = "safari"
+    elif "brave" in ua:
+        browser = "brave"
+    else:
+        browser = None
+    return device, os, browser
+
+
+_TOKENS = (
+    "mobile", "iphone", "android", "ipod", "ipad", "tablet", "ios", "windows", "mac os x", "macintosh",
+    "cros", "linux", "yabrowser", "yandex", "opr/", "opr", "opera", "edg/", "edge", "edg", "samsungbrowser",
+    "firefox", "fxios", "crios", "chrome", "chromium", "safari", "brave",
+)
+# Zero-width lookahead so overlapping tokens ("crios" and "ios") are all found in one pass
+_TOKEN_RE = re.compile("(?=(" + "|".join(re.escape(t) for t in sorted(_TOKENS, key=len, reverse=True)) + "))")
+_IMPLIED = {token: frozenset(t for t in _TOKENS if token.startswith(t)) for token in _TOKENS}
+
+
+def regex_single_pass(user_agent: str) -> tuple[str, Optional[str], Optional[str]]:
+    """Candidate matcher: collect every token in one regex pass, then apply the same precedence."""
+    found: set[str] = set()
+    for token in _TOKEN_RE.findall(user_agent.lower()):
+        found |= _IMPLIED[token]
+    return legacy_detect(" ".join(found))
+
+
+def _cold_ns_per_call(user_agents: list[str], rounds: int) -> float:
+    total = 0
+    for _ in range(rounds):
+        classifier = UserAgentClassifier(max_size=len(user_agents))
+        start = perf_counter_ns()
+        for ua in user_agents:
+            classifier.classify(ua)
+        total += perf_counter_ns() - start
+    return total / (rounds * len(user_agents))
+
+
+def run(rounds: int = 200, user_agents: Optional[list[str]] = None) -> list[dict]:
+    user_agents = user_agents if user_agents is not None else load_user_agents()
+    mismatches = [
+        ua for ua in user_agents
+        if not (legacy_detect(ua) == regex_single_pass(ua) == _classify(ua) == UserAgentClassifier().classify(ua))
+    ]
+    if mismatches:
+        raise AssertionError(f"classifier disagrees with legacy rules for: {mismatches[:3]}")
+
+    warm = UserAgentClassifier(max_size=len(user_agents))
+    for ua in user_agents:
+        warm.classify(ua)
+    calls = rounds * len(user_agents)
+    return [
+        result("ua_classify/legacy", ns_per_call(legacy_detect, user_agents, rounds), calls),
+        result("ua_classify/regex_single_pass", ns_per_call(regex_single_pass, user_agents, rounds), calls),
+        result("ua_classify/uncached", ns_per_call(_classify, user_agents, rounds), calls),
+        result("ua_classify/memo_cold", _cold_ns_per_call(user_agents, rounds), calls),
+        result("ua_classify/memo_warm", ns_per_call(warm.classify, user_agents, rounds), calls),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark user-agent classification.")
+    parser.add_argument("--rounds", type=int, default=200, help="Passes over the UA corpus per measurement")
+    args = parser.parse_args()
+    user_agents = load_user_agents()
+    print(f"{len(user_agents)} user agents, {args.rounds} rounds")
+    print_results(run(args.rounds, user_agents))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+EXPLAIN check for the date-range scan queries.
+
+Runs the real crud/export code paths with a from/to range, captures every
+statement they send that touches qr_scans, and EXPLAINs each one. The check
+fails if any of them reads qr_scans with a full table scan instead of an
+index.
+
+    python benchmarks/explain_scan_ranges.py                      # throwaway SQLite file
+    python benchmarks/explain_scan_ranges.py --database-url URL   # e.g. a migrated PostgreSQL
+
+On PostgreSQL the planner will happily seq-scan a tiny table, so the check
+disables seq scans for its EXPLAIN session. The question it answers is
+whether an index can drive each query, not what the planner picks at this
+table size.
+"""
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+def _plan_uses_index(dialect: str, plan: list[str]) -> bool:
+    text = "\n".join(plan)
+    if dialect == "postgresql":
+        return "Seq Scan on qr_scans" not in text
+    # SQLite: "SCAN qr_scans" without "USING ... INDEX" is a full table scan
+    return not re.search(r"SCAN qr_scans(?! USING)", text)
+
+
+async def _run(seed: bool) -> int:
+    from sqlalchemy import event, select
+
+    from app.crud_dynamic_qr import count_qr_scans, get_raw_scan_stats, list_qr_scans_page, record_scans_bulk
+    from app.db import AsyncSessionLocal, Base, engine
+    from app.models import DynamicQR, User
+    from app.scan_export import export_scans
+
+    dialect = engine.dialect.name
+    if seed:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncSessionLocal() as session:
+            user = User(email="explain@example.com")
+            session.add(user)
+            await session.flush()
+            qr = DynamicQR(user_id=user.id, short_code="explain1", destination_url="https://example.com")
+            session.add(qr)
+            await session.flush()
+            start = datetime.now(timezone.utc) - timedelta(days=60)
+            await record_scans_bulk(session, [
+                {"qr_id": qr.id, "scanned_at": start + timedelta(minutes=7 * i), "device": "mobile", "os": "ios",
+                 "browser": "safari", "country": "DE", "ip": None, "region": None, "city": None,
+                 "user_agent": None, "referrer": None}
+                for i in range(5000)
+            ])
+
+    async with AsyncSessionLocal() as session:
+        qr = (await session.execute(select(DynamicQR).limit(1))).scalar_one_or_none()
+    if qr is None:
+        print("No dynamic QR rows to query; run without --database-url to use seeded SQLite.")
+        return 1
+
+    captured: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "qr_scans" in statement and not statement.lstrip().upper().startswith(("INSERT", "EXPLAIN")):
+            captured.append((statement, parameters))
+
+    until = datetime.now(timezone.utc)
+    since = until - timedelta(days=30)
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        async with AsyncSessionLocal() as session:
+            await count_qr_scans(session, qr.id, since, until)
+            await get_raw_scan_stats(session, qr.id, since, until)
+            await list_qr_scans_page(session, qr.id, limit=50, since=since, until=until)
+        async for _ in export_scans(qr.user_id, "csv", qr_id=qr.id, since=since, until=until):
+            pass
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+    failures = 0
+    async with engine.connect() as conn:
+        if dialect == "postgresql":
+            await conn.exec_driver_sql("ANALYZE qr_scans")
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+            prefix = "EXPLAIN "
+        else:
+            await conn.exec_driver_sql("ANALYZE")
+            prefix = "EXPLAIN QUERY PLAN "
+        for statement, parameters in captured:
+            result = await conn.exec_driver_sql(prefix + statement, parameters)
+            plan = [str(row[-1]) for row in result]
+            ok = _plan_uses_index(dialect, plan)
+            failures += not ok
+            print(("ok  " if ok else "FAIL") + "  " + " ".join(statement.split())[:110])
+            for line in plan:
+                print("        " + line)
+    print(f"{len(captured) - failures}/{len(captured)} range queries are index-driven on {dialect}")
+    return 1 if failures or not captured else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="EXPLAIN the date-range scan queries.")
+    parser.add_argument("--database-url", help="Database to check (defaults to a seeded temporary SQLite file)")
+    args = parser.parse_args()
+    seed = args.database_url is None
+    if seed:
+        path = os.path.join(tempfile.mkdtemp(prefix="qr-explain-"), "explain.sqlite3")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    else:
+        os.environ["DATABASE_URL"] = args.database_url
+    sys.exit(asyncio.run(_run(seed)))
+
+
+if __name__ == "__main__":
+    main()
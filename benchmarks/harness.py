@@ -0,0 +1,48 @@
+"""
+Shared timing helpers and corpus loading for the benchmark scripts.
+"""
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Any, Callable, Iterable
+import json
+import os
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = PROJECT_ROOT / "benchmarks" / "data"
+
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+# app.db refuses to import without a URL; benchmarks never open a connection
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+
+def load_lines(name: str) -> list[str]:
+    """Non-empty, non-comment lines of a corpus file in benchmarks/data."""
+    lines = (DATA_DIR / name).read_text(encoding="utf-8").splitlines()
+    return [line for line in lines if line.strip() and not line.startswith("#")]
+
+
+def load_ndjson(name: str) -> list[Any]:
+    return [json.loads(line) for line in load_lines(name)]
+
+
+def ns_per_call(fn: Callable, inputs: list, rounds: int, warmup: bool = True) -> float:
+    """Mean wall time of ``fn(item)`` over ``rounds`` passes through ``inputs``."""
+    if warmup:
+        # Keep one-off costs (lazy imports, first-use compilation) out of the figure
+        fn(inputs[0])
+    start = perf_counter_ns()
+    for _ in range(rounds):
+        for item in inputs:
+            fn(item)
+    return (perf_counter_ns() - start) / (rounds * len(inputs))
+
+
+def result(name: str, ns: float, calls: int, **extra: Any) -> dict:
+    return {"name": name, "ns_per_call": round(ns, 1), "calls": calls, **extra}
+
+
+def print_results(results: Iterable[dict]) -> None:
+    for item in results:
+        print(f"{item['name']:<34} {item['ns_per_call']:>12.0f} ns/call")
@@ -0,0 +1,76 @@
+"""
+Run the benchmark suite and emit machine-readable results.
+
+    python benchmarks/run.py [--rounds 200] [--output results.json] [--only client_ip]
+
+The JSON document has a ``meta`` block (interpreter, platform, git revision,
+timestamp) and a ``results`` list of {name, ns_per_call, calls} entries, so
+runs from before and after a change can be diffed directly.
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import platform
+import subprocess
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.harness import PROJECT_ROOT, print_results  # noqa: E402
+from benchmarks import bench_hot_path, bench_qr_render, bench_qr_svg, bench_ua_classifier  # noqa: E402
+
+SUITES = {
+    "hot_path": bench_hot_path.run,
+    "ua_classifier": bench_ua_classifier.run,
+    # A stock version-40 SVG takes ~0.5 s; scale the pass count down
+    "qr_svg": lambda rounds: bench_qr_svg.run(max(1, rounds // 40)),
+    # Stock renders of the 2 KB vCard take ~0.1 s each; EC L and H at 300 px only
+    "qr_render": lambda rounds: bench_qr_render.run(max(1, rounds // 100)),
+}
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument("--rounds", type=int, default=200, help="Passes over each corpus per measurement")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout")
+    parser.add_argument("--only", help="Only keep results whose name starts with this prefix")
+    args = parser.parse_args()
+
+    results = []
+    for suite, run in SUITES.items():
+        for item in run(args.rounds):
+            if args.only and not item["name"].startswith(args.only):
+                continue
+            results.append({"suite": suite, **item})
+
+    document = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "git_revision": _git_revision(),
+            "rounds": args.rounds,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+        print_results(results)
+    else:
+        print(json.dumps(document, indent=2))
+
+
+if __name__ == "__main__":
+    main()